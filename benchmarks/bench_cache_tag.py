@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Compares cached property get/set latency of a LeCroy driver with the old
+inspect.stack() cache tag lookup and the current frame lookup in
+ivi.Driver._get_cache_tag. Run from the repository root with
+
+    python3 -m benchmarks.bench_cache_tag
+"""
+
+import inspect
+import time
+
+from cost_power_monitor import ivi
+from cost_power_monitor.ivi.lecroy import lecroyWR8404M
+from cost_power_monitor.ivi.lecroy.test.test_lecroyWR8404M import VirtualWR8404M
+
+calls = 50
+repeats = 3
+
+
+def legacy_get_cache_tag(self, tag=None, skip=1):
+    "Cache tag lookup as done before, walking the whole stack"
+    if tag is None:
+        stack = inspect.stack()
+        start = 0 + skip
+        if len(stack) < start + 1:
+            return ''
+        tag = stack[start][3]
+
+    if tag[0:4] == "_get": tag = tag[4:]
+    if tag[0:4] == "_set": tag = tag[4:]
+    if tag[0] == "_": tag = tag[1:]
+
+    return tag
+
+
+def best_of(f):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        for k in range(calls):
+            f()
+        times.append(time.perf_counter() - start)
+    return min(times) / calls
+
+
+def measure(scope):
+    channel = scope.channels[0]
+    scope.timebase.scale = 1e-6
+    channel.offset = 0.1
+
+    def get_timebase():
+        return scope.timebase.scale
+
+    def set_timebase():
+        scope.timebase.scale = 1e-6
+
+    def get_offset():
+        return channel.offset
+
+    return [("timebase.scale get", best_of(get_timebase)),
+            ("timebase.scale set", best_of(set_timebase)),
+            ("channels[0].offset get", best_of(get_offset))]
+
+
+def main():
+    scope = lecroyWR8404M(VirtualWR8404M())
+
+    current = ivi.Driver._get_cache_tag
+    ivi.Driver._get_cache_tag = legacy_get_cache_tag
+    try:
+        old = measure(scope)
+    finally:
+        ivi.Driver._get_cache_tag = current
+    new = measure(scope)
+
+    print("%-24s %12s %12s %9s" % ("", "inspect", "frame", "speedup"))
+    for (name, t_old), (name, t_new) in zip(old, new):
+        print("%-24s %9.1f us %9.1f us %8.0f x" % (name, t_old * 1e6, t_new * 1e6, t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
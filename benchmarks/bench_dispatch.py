@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Measures the attribute dispatch overhead of the ivi property collections
+on a LeCroy driver in simulate mode: fetch_waveform through the channel
+tree, managed property get/set and plain private attribute reads. Run from
+the repository root with
+
+    python3 -m benchmarks.bench_dispatch
+"""
+
+import contextlib
+import io
+import time
+
+from cost_power_monitor.ivi.lecroy import lecroyWR8404M
+
+calls = 100000
+repeats = 5
+
+
+def best_of(f, n=calls):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        for k in range(n):
+            f()
+        times.append(time.perf_counter() - start)
+    return min(times) / n
+
+
+def main():
+    # simulate mode prints every write, keep the output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_init = best_of(lambda: lecroyWR8404M('TCPIP::localhost::INSTR', simulate=True), 20)
+        scope = lecroyWR8404M('TCPIP::localhost::INSTR', simulate=True)
+    channel = scope.channels[0]
+
+    def fetch():
+        return scope.channels[0].measurement.fetch_waveform()
+
+    def get_property():
+        return channel.offset
+
+    def set_property():
+        channel.offset = 0.1
+
+    def get_private():
+        return scope._driver_operation_simulate
+
+    def set_private():
+        scope._timebase_scale = 1e-6
+
+    print("driver init            %9.3f ms" % (t_init * 1e3))
+    for name, f in [("fetch_waveform", fetch),
+                    ("managed get", get_property),
+                    ("managed set", set_property),
+                    ("private get", get_private),
+                    ("private set", set_private)]:
+        print("%-22s %9.3f us" % (name, best_of(f) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
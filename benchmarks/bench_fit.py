@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Accuracy and speed of the sine fit engines of fit_func on synthetic
+noisy 13.56 MHz sinusoids sampled at 10 GS/s. Run from the repository
+root with
+
+    python3 -m benchmarks.bench_fit
+"""
+
+import time
+
+import numpy as np
+
+from cost_power_monitor.cost_power_monitor import fit_engines
+
+trials = 20
+frequency = 13.56e6
+dt = 1e-10
+
+
+def run(engine, points, noise, rng):
+    t = np.arange(points) * dt - points * dt / 2
+    times = []
+    amp_errors = []
+    phase_errors = []
+    for i in range(trials):
+        f = frequency * (1 + 0.01 * rng.standard_normal())
+        phase = rng.uniform(0, 2*np.pi)
+        y = np.sin(2*np.pi*f*t + phase) + 0.1 + noise * rng.standard_normal(points)
+        start = time.perf_counter()
+        amp, freq, est_phase = fit_engines[engine](t, y)
+        times.append(time.perf_counter() - start)
+        amp_errors.append(amp - 1)
+        phase_errors.append((est_phase - phase + np.pi) % (2*np.pi) - np.pi)
+    rms = lambda e: np.sqrt(np.mean(np.square(e)))
+    return np.median(times), rms(amp_errors), rms(phase_errors)
+
+
+def main():
+    print("%-8s %8s %6s %10s %12s %12s" % ("engine", "points", "noise",
+          "time/ms", "amp rms err", "phase rms/rad"))
+    for points in (10000, 100000, 1000000):
+        for noise in (0.01, 0.1):
+            for engine in fit_engines:
+                rng = np.random.default_rng(points)
+                t, amp_err, phase_err = run(engine, points, noise, rng)
+                print("%-8s %8d %6.2f %10.2f %12.2e %12.2e" % (engine, points,
+                      noise, t * 1e3, amp_err, phase_err))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Measures the cost of moving two channel 1M point frames from io_worker
+to a fit_worker, through the Manager queue as before and through the
+shared memory waveform_ring. Run from the repository root with
+
+    python3 -m benchmarks.bench_ipc
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from cost_power_monitor import ivi
+from cost_power_monitor.cost_power_monitor import waveform_ring
+
+points = 1000000
+frames = 50
+
+
+def make_frame():
+    data_dict = {}
+    for chan_name in ("voltage", "current"):
+        trace = ivi.TraceYT()
+        trace.y_raw = np.random.randint(-32768, 32767, points).astype('>i2')
+        trace.x_increment = 1e-10
+        trace.y_increment = 1e-3
+        data_dict[chan_name] = trace
+    return data_dict
+
+
+def producer(data_queue, ring):
+    data_dict = make_frame()
+    for i in range(frames):
+        if ring is None:
+            data_queue.put(data_dict)
+        else:
+            data_queue.put(ring.write(data_dict))
+
+
+def consumer(data_queue, ring, done_queue):
+    for i in range(frames):
+        frame = data_queue.get()
+        data_dict = frame if ring is None else ring.read(frame)
+        for trace in data_dict.values():
+            np.asarray(trace.y_raw).sum()
+        if ring is not None:
+            ring.release(frame)
+    done_queue.put(time.perf_counter())
+
+
+def run(ring):
+    mgr = multiprocessing.Manager()
+    data_queue = mgr.Queue(14)
+    done_queue = multiprocessing.Queue()
+    c = multiprocessing.Process(target=consumer, args=(data_queue, ring, done_queue))
+    c.start()
+    start = time.perf_counter()
+    p = multiprocessing.Process(target=producer, args=(data_queue, ring))
+    p.start()
+    end = done_queue.get()
+    p.join()
+    c.join()
+    mgr.shutdown()
+    return (end - start) / frames
+
+
+def main():
+    t_queue = run(None)
+    ring = waveform_ring(16)
+    t_ring = run(ring)
+    ring.close()
+    print("frame: 2 channels x %d points" % points)
+    print("manager queue: %8.2f ms/frame" % (t_queue * 1e3))
+    print("waveform_ring: %8.2f ms/frame" % (t_ring * 1e3))
+    print("speedup:       %8.1f x" % (t_queue / t_ring))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compares LeCroy waveform decoding speed of the old per point struct loop
+with the NumPy decode in lecroyBaseScope on synthetic 1M point WAVEFORM
+blocks. Run from the repository root with
+
+    python3 -m benchmarks.bench_lecroy_decode
+"""
+
+import struct
+import time
+
+import numpy as np
+
+from cost_power_monitor.ivi.lecroy import lecroyWR8404M
+from cost_power_monitor.ivi.lecroy.test.test_lecroyWR8404M import VirtualWR8404M
+
+points = 1000000
+repeats = 3
+
+
+def legacy_decode(raw_data, points, xincrement, xorigin, yincrement, yorigin):
+    "Per point decode as done before the NumPy path"
+    data = list()
+    for i in range(points):
+        x = (i * xincrement) + xorigin
+        yval = struct.unpack(">H", raw_data[i * 2:i * 2 + 2])[0]
+        if yval > 32767:
+            yval = yval - (2 ** 16)
+        if yval == 0:
+            y = float('nan')
+        else:
+            y = (yincrement * yval) - yorigin
+        data.append((x, y))
+    return data
+
+
+def best_of(f):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    y_raw = np.random.randint(-32768, 32767, points)
+    vscope = VirtualWR8404M()
+    vscope.set_waveform(y_raw)
+    raw_data = vscope.waveform.tobytes()
+    desc = vscope.wavedesc
+
+    scope = lecroyWR8404M(vscope)
+    channel = scope.channels[0]
+
+    def new():
+        trace = channel.measurement.fetch_waveform()
+        return np.asarray(trace)
+
+    def old():
+        return legacy_decode(raw_data, points, desc['HORIZ_INTERVAL'],
+            desc['HORIZ_OFFSET'], desc['VERTICAL_GAIN'], desc['VERTICAL_OFFSET'])
+
+    t_old = best_of(old)
+    t_new = best_of(new)
+    print("points per block: %d" % points)
+    print("struct loop: %8.3f s  %12.0f points/s" % (t_old, points / t_old))
+    print("numpy:       %8.3f s  %12.0f points/s" % (t_new, points / t_new))
+    print("speedup:     %8.1f x" % (t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Compares the Rohde & Schwarz waveform fetch with ASCII transfer, as done
+before with a Python float() per sample, against the NumPy decoded ASCII,
+REAL,32 and INT,16 transfers, on canned 1M point responses of a virtual
+RTO6. Prints bytes on the bus and decode throughput. Run from the
+repository root with
+
+    python3 -m benchmarks.bench_rs_transfer
+"""
+
+import io
+import time
+
+import numpy as np
+
+from cost_power_monitor.ivi.rohdeschwarz import rohdeschwarzRTO6
+from cost_power_monitor.ivi.rohdeschwarz.rohdeschwarzBaseScope import WaveformTransferFormatMapping
+from cost_power_monitor.ivi.rohdeschwarz.test.test_rohdeschwarzRTO6 import VirtualRTO6
+
+points = 1000000
+repeats = 3
+
+
+class CannedRTO6(VirtualRTO6):
+    "VirtualRTO6 that encodes the waveform only once per format"
+    def __init__(self):
+        super(CannedRTO6, self).__init__()
+        self.responses = {}
+
+    def write_raw(self, data):
+        cmd = data.decode().strip()
+        if cmd.endswith(':data?'):
+            if self.data_format not in self.responses:
+                super(CannedRTO6, self).write_raw(data)
+                self.responses[self.data_format] = self.read_buffer.getvalue()
+            self.read_buffer = io.BytesIO(self.responses[self.data_format])
+        else:
+            super(CannedRTO6, self).write_raw(data)
+
+    def read_raw(self, num=-1):
+        return super(CannedRTO6, self).read_raw(num)
+
+
+def legacy_fetch(scope, index):
+    "ASCII fetch as done before the NumPy decode"
+    name = scope._channel_name[index]
+    data_header = scope._ask("%s:data:header?" % name).split(',')
+    x0 = float(data_header[0])
+    xN = float(data_header[1])
+    N = int(data_header[2])
+    dx = (xN - x0) / N
+    x = [(x0 + i * dx) for i in range(0, N)]
+    y = scope._ask("%s:data?" % name).split(',')
+    y = [float(yi) for yi in y]
+    return list(zip(x, y))
+
+
+def best_of(f):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    vscope = CannedRTO6()
+    vscope.set_waveform(np.round(np.random.uniform(-32768, 32767, points)))
+    scope = rohdeschwarzRTO6(vscope)
+    channel = scope.channels[0]
+
+    def fetch(transfer_format):
+        def f():
+            scope._waveform_transfer_format = transfer_format
+            return np.asarray(channel.measurement.fetch_waveform())
+        return f
+
+    def old():
+        scope._waveform_transfer_format = 'ascii'
+        channel.measurement.fetch_waveform() # selects ascii format
+        return legacy_fetch(scope, 0)
+
+    print("points per waveform: %d" % points)
+    print("%-20s %10s %10s %14s" % ("transfer", "MB", "s", "points/s"))
+    for name, transfer_format, f in [("ascii, float() loop", 'ascii', old),
+                                     ("ascii, numpy", 'ascii', fetch('ascii')),
+                                     ("real32", 'real32', fetch('real32')),
+                                     ("int16", 'int16', fetch('int16'))]:
+        t = best_of(f)
+        size = len(vscope.responses[WaveformTransferFormatMapping[transfer_format]]) / 1e6
+        print("%-20s %10.1f %10.3f %14.0f" % (name, size, t, points / t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Compares usbtmc.Instrument.read_raw with the old bytes concatenating
+receive loop on a fake instrument that answers with 10 to 100 MB IEEE blocks
+in max_transfer_size pieces. Run from the repository root with
+
+    python3 -m benchmarks.bench_usbtmc_read
+"""
+
+import array
+import struct
+import sys
+import time
+
+from cost_power_monitor.usbtmc import usbtmc
+
+sizes = [10, 30, 100] # MB
+repeats = 3
+
+
+class FakeEndpoints(object):
+    "Bulk out and bulk in endpoints of an instrument sending one IEEE block"
+    def __init__(self, size):
+        payload = bytes(range(256)) * (size // 256)
+        self.message = b'#9%09d' % len(payload) + payload + b'\n'
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.request = None
+
+    def write(self, data, timeout=None):
+        self.request = data
+
+    def read(self, size, timeout=None):
+        msgid, btag, btaginverse = struct.unpack_from('BBBx', self.request)
+        transfer_size = struct.unpack_from('<L', self.request, 4)[0]
+        chunk = self.message[self.offset:self.offset+transfer_size]
+        self.offset += len(chunk)
+        eom = self.offset >= len(self.message)
+        header = struct.pack('<BBBxLBxxx', msgid, btag, btaginverse, len(chunk), eom)
+        return array.array('B', header + chunk + b'\0'*((4 - (len(chunk) % 4)) % 4))
+
+
+def legacy_read_raw(self, num=-1):
+    "Receive loop as done before, joining bytes objects"
+    read_len = self.max_transfer_size
+    if 0 < num < read_len:
+        read_len = num
+    eom = False
+    read_data = b''
+    while not eom:
+        req = self.pack_dev_dep_msg_in_header(read_len, None)
+        self.bulk_out_ep.write(req, timeout=self._timeout_ms)
+        resp = self.bulk_in_ep.read(read_len+usbtmc.USBTMC_HEADER_SIZE+3, timeout=self._timeout_ms)
+        resp = resp.tobytes()
+        msgid, btag, btaginverse, transfer_size, transfer_attributes, data = self.unpack_dev_dep_resp_header(resp)
+        eom = transfer_attributes & 1
+        read_data += data
+        if num > 0:
+            num = num - len(data)
+            if num <= 0:
+                break
+            if num < read_len:
+                read_len = num
+    return read_data
+
+
+def best_of(f, endpoints):
+    times = []
+    for i in range(repeats):
+        endpoints.reset()
+        start = time.perf_counter()
+        data = f()
+        times.append(time.perf_counter() - start)
+    return min(times), data
+
+
+def main():
+    instr = usbtmc.Instrument(object())
+    instr.connected = True
+
+    print("%8s %12s %12s %9s" % ("MB", "bytes +=", "bytearray", "speedup"))
+    for size in sizes:
+        endpoints = FakeEndpoints(size*1024*1024)
+        instr.bulk_out_ep = instr.bulk_in_ep = endpoints
+
+        t_old, old = best_of(lambda: legacy_read_raw(instr), endpoints)
+        t_new, new = best_of(lambda: instr.read_raw(), endpoints)
+        if old != new:
+            sys.exit("read_raw returned different data")
+        print("%8d %9.3f s  %9.3f s  %8.1f x" % (size, t_old, t_new, t_old / t_new))
+    instr.connected = False
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,25 @@
 #!/usr/bin/python3
 
+import os
+import queue
 import sys
 import string
+import threading
 import time
+import uuid
 import numpy as np
 import datetime
+import itertools
 from . import ivi
 from . import usbtmc
 from usb import USBError
 
 from multiprocessing import Process, Queue, cpu_count
 import multiprocessing
+try: # shared memory needs python 3.8
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
 from scipy.optimize import leastsq
 try: # old scipy calls it simps
     from scipy.integrate import simpson
@@ -20,8 +29,8 @@ except:
 from scipy import stats
 from PyQt5 import QtCore
 from PyQt5.QtWidgets import QFrame, QWidget, QHBoxLayout, QVBoxLayout, QTabWidget
-from PyQt5.QtWidgets import QTableWidget, QPushButton, QLabel, QFileDialog
-from PyQt5.QtWidgets import QMessageBox, QApplication, QTableWidgetItem
+from PyQt5.QtWidgets import QTableView, QPushButton, QLabel, QFileDialog
+from PyQt5.QtWidgets import QMessageBox, QApplication
 from PyQt5.QtWidgets import QGroupBox, QComboBox, QLineEdit
 import pyqtgraph
 # importing this after pyqt5 tells pyqtgraph to use qt5 instead of 4
@@ -33,37 +42,48 @@ volcal_std = 50
 resistance = 4.29616
 #frequency = 13560000
 power_method = 'phaseshift'
-result_queue = Queue(100)
+fit_engine = 'leastsq'
+result_queue = None # frame_queue of fit results, see start_services
+result_queue_policy = 'block' # When results aren't taken: 'block' or 'drop-oldest'
+fit_queue_policy = 'block' # When fitting can't keep up: 'block' or 'drop-oldest'
 voltage_ref_phase = 0
 voltage_ref_phase_std = 0
 current_ref_phase = 0
 current_ref_phase_std = 0
 ref_size = 14 # Number of phase reference points to average over
+fit_batch = 16 # Max. number of queued frames a fit process handles at once
+fit_processes = max(cpu_count()-1, 1) # Number of fit processes, started once
+timing_interval = 0 # Seconds between acquisition timing reports, 0 is off
+usb_tuning = False # Measure the best USB transfer size of a new scope on the first start, takes a few seconds
+usb_error_limit = 10 # USB errors in a row that end a run
+request_timeout = 60 # Seconds to wait for a reply of the acquisition service
+segments = 1 # Triggers captured per transfer with segmented acquisition, 1 is off
 scope_id = None
 
 def get_scope(scope_id):
-    "Scope database. Add yours here!"
+    """Scope database. Add yours here!
+    The usbtmc instrument looked up here is handed to the driver, so the
+    device is only found and opened once."""
     device = usbtmc.Instrument(scope_id)
     idV = device.idVendor
     idP = device.idProduct
-    device.close()
 
     if idV == 0x0957 and idP == 0x175D:
-        scope = ivi.agilent.agilentMSO7104B(scope_id)
+        scope = ivi.agilent.agilentMSO7104B(device)
 
     # Lecroy scopes, seems to work for multiple models which send the same idP
     # tested for WR8404M, HDO6104A, WS3014z
     elif idV == 0x05ff and idP == 0x1023:
-        scope = ivi.lecroy.lecroyWR8404M(scope_id)
+        scope = ivi.lecroy.lecroyWR8404M(device)
 
     elif idV == 0x0957 and idP == 6042: # York, untested
-        scope = ivi.agilent.agilentDSOX2004A(scope_id)
+        scope = ivi.agilent.agilentDSOX2004A(device)
 
     elif idV == 0xaad and idP == 0x0197: #Rohde&Schwarz RTO6
-        scope = ivi.rohdeschwarz.rohdeschwarzRTO6(scope_id) 
+        scope = ivi.rohdeschwarz.rohdeschwarzRTO6(device) 
 
     else:
-        scope = ivi.lecroy.lecroyWR8404M(scope_id) # your IVI scope here!
+        scope = ivi.lecroy.lecroyWR8404M(device) # your IVI scope here!
 
     return scope
 
@@ -91,7 +111,8 @@ class main_window(QWidget):
 class data_monitor(QVBoxLayout):
     def __init__(self):
         super().__init__()
-        self.results = []
+        self.results = result_store()
+        self.dropped = 0
         self.tab_bar = QTabWidget()
         pyqtgraph.setConfigOption('background', 'w')
         pyqtgraph.setConfigOption('foreground', 'k')
@@ -99,10 +120,9 @@ class data_monitor(QVBoxLayout):
         self.graph.setLabel("left","power / W")
         self.graph.setLabel("bottom","voltage / V")
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Voltage / V", "Current / A",
-                                    "Phaseshift / rad", "Power / W", "Time"])
+        self.table_model = result_model(self.results)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
         self.tab_bar.addTab(self.table, "Table")
         self.tab_bar.addTab(self.graph, "Graph")
 
@@ -132,11 +152,13 @@ class data_monitor(QVBoxLayout):
 
 
     def clear_data(self):
-        global result_queue
-        result_queue.close()
-        result_queue = Queue(100) 
-        self.table.setRowCount(0)
-        self.results = []
+        # the fit processes keep putting into the same result_queue
+        while not result_queue.empty():
+            try:
+                result_queue.get_nowait()
+            except queue.Empty:
+                break
+        self.table_model.clear()
         
 
     def save_data(self):
@@ -155,17 +177,17 @@ class data_monitor(QVBoxLayout):
                       "# Calibration factor: " + str(volcal) + "\n" +
                       "# Measurement resistance: " + str(resistance) + "\n" +
                       "# Power calculation method: " + str(power_method) + "\n" +
+                      "# Sine fit: " + str(fit_engine) + "\n" +
                       "# Channel Settings: " +  str(channel_assignment) + "\n\n")
                     
             table_header = ("Voltage" + seperator + "Current" +  seperator + 
                 "Phaseshift" + seperator + "Power" + seperator + "Time" + next_line)
 
             lines = [header, table_header]
-            for x in range(self.table.rowCount()):
-                this_line = ""
-                for y in range(self.table.columnCount()):
-                    this_line = this_line + str(self.table.item(x,y).text()) + seperator
-                lines.append(this_line + next_line)
+            columns = [self.table_model.column_text(y)
+                       for y in range(self.table_model.columnCount())]
+            for row in zip(*columns):
+                lines.append(seperator.join(row) + seperator + next_line)
 
             try:
                 f = open(filename[0], 'w')
@@ -180,16 +202,22 @@ class data_monitor(QVBoxLayout):
 
 
     def copy_data(self):
-        QApplication.clipboard().setText(np.array2string(np.array(self.results)))
+        QApplication.clipboard().setText(np.array2string(self.results.values()))
      
 
     def update(self):
+        dropped = result_queue.count('dropped')
+        if dropped > self.dropped:
+            print("%d results dropped, the display can't keep up." % (dropped - self.dropped))
+            self.dropped = dropped
+        # everything queued is added as one batch, with one table update
+        batch = []
         while not result_queue.empty():
-            new_data = result_queue.get()
-            if new_data:
-                self.results.append(new_data)
-                self.update_table(new_data)
-                self.update_power_dspl(new_data[-1])
+            batch.extend(new_data for new_data in result_queue.get() if new_data)
+        if batch:
+            self.table_model.append(batch, time.time())
+            self.table.scrollToBottom()
+            self.update_power_dspl(batch[-1][-1])
 
 
     def update_power_dspl(self, power):
@@ -200,27 +228,126 @@ class data_monitor(QVBoxLayout):
         """Updates the Graph with new data, 
         this data beeing an 2 dim array of voltage and power"""
         self.graph.clear()
-        if self.results:
-            voltage = np.array(self.results)[:,0]
-            power = np.array(self.results)[:,3]
-            self.graph.plot(title="power", x=voltage, y=power, symbol='o')
-
-
-    def update_table(self,data):
-        """Updates the table with new data. 
-        Data is array with voltage, current, phaseshift and power"""
-        #print(data)
-        self.table.insertRow(self.table.rowCount())
-        for i,d in enumerate(data):
-            if i == 2:
-                r = 10 # round phaseshift very precise
-            else:
-                r = 3 # rest to third position after comma
-            self.table.setItem(self.table.rowCount()-1,i,QTableWidgetItem(str(round(d,r))))
-        time = datetime.datetime.now().time().strftime("%H:%M:%S")
-        self.table.setItem(self.table.rowCount()-1,self.table.columnCount()-1,QTableWidgetItem(str(time)))        
-        self.table.scrollToBottom()
-            
+        if len(self.results):
+            self.graph.plot(title="power", x=self.results['voltage'],
+                            y=self.results['power'], symbol='o')
+
+
+class result_store():
+    """Results in one NumPy array per column: voltage, current, phaseshift,
+    power and time (seconds since the epoch). The arrays are preallocated
+    and grow by doubling, so appending is amortized O(1), and
+    store['power'] is a view of the filled part of a column."""
+    names = ('voltage', 'current', 'phaseshift', 'power', 'time')
+
+    def __init__(self, size=1024):
+        self.rows = 0
+        self.arrays = dict((name, np.zeros(size)) for name in self.names)
+
+
+    def __len__(self):
+        return self.rows
+
+
+    def __getitem__(self, name):
+        return self.arrays[name][:self.rows]
+
+
+    def append(self, results, timestamp):
+        "Appends 4-tuples of voltage, current, phaseshift and power"
+        count = len(results)
+        size = len(self.arrays['time'])
+        if self.rows + count > size:
+            size = max(2*size, self.rows + count)
+            for name in self.names:
+                array = np.zeros(size)
+                array[:self.rows] = self.arrays[name][:self.rows]
+                self.arrays[name] = array
+        values = np.array(results, dtype=float).reshape(count, 4)
+        end = self.rows + count
+        for i, name in enumerate(self.names[:4]):
+            self.arrays[name][self.rows:end] = values[:,i]
+        self.arrays['time'][self.rows:end] = timestamp
+        self.rows = end
+
+
+    def values(self):
+        "Voltage, current, phaseshift and power as rows of an array"
+        return np.column_stack([self[name] for name in self.names[:4]])
+
+
+    def clear(self):
+        self.rows = 0
+
+
+class result_model(QtCore.QAbstractTableModel):
+    """Table model of a result_store. Results are appended in batches with
+    one rowsInserted signal per batch."""
+    columns = ["Voltage / V", "Current / A", "Phaseshift / rad", "Power / W", "Time"]
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.store[self.store.names[index.column()]][index.row()]
+        return self.text(index.column(), value)
+
+
+    def text(self, column, value):
+        if column == 4:
+            return datetime.datetime.fromtimestamp(value).strftime("%H:%M:%S")
+        elif column == 2:
+            return str(round(value,10)) # round phaseshift very precise
+        else:
+            return str(round(value,3)) # rest to third position after comma
+
+
+    def column_text(self, column):
+        "All cells of a column as shown in the table"
+        return [self.text(column, value)
+                for value in self.store[self.store.names[column]].tolist()]
+
+
+    def append(self, results, timestamp):
+        "Appends results to the store, see result_store.append"
+        count = len(results)
+        if count == 0:
+            return
+        rows = len(self.store)
+        self.beginInsertRows(QtCore.QModelIndex(), rows, rows + count - 1)
+        self.store.append(results, timestamp)
+        self.endInsertRows()
+
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.endResetModel()
+
 
 class ctrl_panel(QVBoxLayout):
     def __init__(self):
@@ -286,7 +413,11 @@ class sweep_tab(QWidget):
     def start_sweep(self):
         if not self.sweeping:
             self.this_sweep = sweeper(channel_assignment, volcal, resistance, voltage_ref_phase, current_ref_phase)
-            self.this_sweep.start()
+            try:
+                self.this_sweep.start()
+            except Exception as e:
+                print(e)
+                return
             self.sweeping = True
 
 
@@ -299,7 +430,11 @@ class sweep_tab(QWidget):
         if not self.sweeping:
             global voltage_ref_phase, current_ref_phase, voltage_ref_phase_std, current_ref_phase_std
             self.this_sweep = sweeper(channel_assignment, volcal, resistance, voltage_ref_phase, current_ref_phase)
-            voltage_ref_phase, current_ref_phase, voltage_ref_phase_std, current_ref_phase_std = self.this_sweep.find_ref()
+            try:
+                voltage_ref_phase, current_ref_phase, voltage_ref_phase_std, current_ref_phase_std = self.this_sweep.find_ref()
+            except Exception as e:
+                print(e)
+                return
             self.ref_label.setText(
                 str(round(voltage_ref_phase - current_ref_phase,10))
                 + " ± "
@@ -403,6 +538,33 @@ class settings_tab(QWidget):
         
         volcal_layout.addLayout(method_row)
         
+        # UI to choose the sine fit
+        fit_row = QHBoxLayout()
+        
+        self.fit_cbox = QComboBox()
+        self.fit_cbox.addItem('Nonlinear (leastsq)')
+        self.fit_cbox.addItem('Linear (fast)')
+        self.fit_cbox.addItem('Linear, refined frequency')
+        self.fit_cbox.addItem('Joint voltage/current')
+        self.fit_cbox.setCurrentIndex(0)
+        self.fit_cbox.currentIndexChanged.connect(self.change_fit)
+        
+        fit_row.addWidget(QLabel("Sine fit: "))
+        fit_row.addWidget(self.fit_cbox)
+        
+        volcal_layout.addLayout(fit_row)
+        
+        # UI to set the number of segments per transfer
+        segments_row = QHBoxLayout()
+        
+        self.segments_box = QLineEdit(str(segments))
+        self.segments_box.setMaximumWidth(100)
+        self.segments_box.textChanged.connect(self.change_segments)
+        segments_row.addWidget(QLabel("Segments per transfer: "))
+        segments_row.addWidget(self.segments_box)
+        
+        volcal_layout.addLayout(segments_row)
+        
         
         l_main_Layout.addWidget(volcal_group)
         self.setLayout(l_main_Layout)
@@ -420,6 +582,27 @@ class settings_tab(QWidget):
             power_method = 'integration'
 
 
+    def change_fit(self):
+        global fit_engine
+        idx = self.fit_cbox.currentIndex()
+        if idx == 0:
+            fit_engine = 'leastsq'
+        if idx == 1:
+            fit_engine = 'sine3'
+        if idx == 2:
+            fit_engine = 'sine4'
+        if idx == 3:
+            fit_engine = 'cross'
+
+
+    def change_segments(self):
+        global segments
+        try:
+            segments = max(int(self.segments_box.text()), 1)
+        except ValueError:
+            pass
+
+
     def change_scope(self):
         global scope_id
         idx = self.scope_cbox.currentIndex()
@@ -436,8 +619,8 @@ class settings_tab(QWidget):
             product = ""
 
         try:
-            scope = get_scope(scope_id)
-            scope.close()
+            start_services()
+            acquisition.open(scope_id)
             scope_known = True
             mark = "✓"
         except Exception as e:
@@ -514,67 +697,679 @@ class channel_settings(QHBoxLayout):
         channel_assignment = this_chan_ass
 
 
+trace_scaling = ('average_count', 'x_increment', 'x_origin', 'x_reference',
+                 'y_increment', 'y_origin', 'y_reference', 'y_hole')
+
+
+class frame_queue():
+    """Bounded queue between processes. When it is full, put() waits with
+    the 'block' policy, so the producer slows down, or makes room by
+    dropping the oldest item with 'drop-oldest'. Shared counters keep track
+    of the items put, taken and dropped. None is the sentinel telling a
+    consumer to stop and is not counted."""
+    counters = ('put', 'taken', 'dropped')
+
+    def __init__(self, maxsize, policy='block'):
+        if policy not in ('block', 'drop-oldest'):
+            raise ValueError("Unknown queue policy %s" % policy)
+        self.queue = Queue(maxsize)
+        self.policy = policy
+        self.counts = multiprocessing.Array('q', len(self.counters))
+
+
+    def count(self, counter, add=0):
+        "Returns a counter, after adding add to it"
+        i = self.counters.index(counter)
+        with self.counts.get_lock():
+            self.counts[i] += add
+            return self.counts[i]
+
+
+    def put(self, item, timeout=None, on_drop=None):
+        """Puts item into the queue. Raises queue.Full if the 'block' policy
+        waited longer than timeout. Dropped items are passed to on_drop."""
+        if self.policy == 'block' or item is None:
+            self.queue.put(item, timeout=timeout)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    pass
+                try:
+                    old = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if old is None: # never drop a sentinel
+                    self.queue.put(old)
+                    continue
+                self.count('dropped', 1)
+                if on_drop is not None:
+                    on_drop(old)
+        if item is not None:
+            self.count('put', 1)
+
+
+    def get(self, block=True, timeout=None):
+        item = self.queue.get(block, timeout)
+        if item is not None:
+            self.count('taken', 1)
+        return item
+
+
+    def get_nowait(self):
+        return self.get(False)
+
+
+    def empty(self):
+        return self.queue.empty()
+
+
+    def stop_consumers(self, consumers, timeout=None):
+        """Puts a sentinel for each consumer, after the items already
+        queued. Raises queue.Full if there was no room within timeout."""
+        for i in range(consumers):
+            self.queue.put(None, timeout=timeout)
+
+
+    def report(self):
+        return ", ".join("%d %s" % (self.count(counter), counter)
+                         for counter in self.counters)
+
+
+class waveform_ring():
+    """Ring of shared memory slots passing waveforms from io_worker to the
+    fit_workers. The samples are written once into a free slot and only a
+    small frame descriptor goes through the data queue. A slot is handed
+    back with release() once its frame is processed. Without
+    multiprocessing.shared_memory the data_dict itself goes into the frame
+    descriptor."""
+    def __init__(self, slots):
+        self.slots = slots
+        self.prefix = "cpm" + uuid.uuid4().hex[:8]
+        # slots in use are marked busy, free_slots counts the others
+        self.free_slots = multiprocessing.Semaphore(slots)
+        self.busy = multiprocessing.RawArray('b', slots)
+        # size and name generation of the segment behind each slot
+        self.size = multiprocessing.RawArray('q', slots)
+        self.generation = multiprocessing.RawArray('i', slots)
+        self.segments = {}
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['segments'] = {}
+        return state
+
+
+    def name(self, slot):
+        return "%s_%d_%d" % (self.prefix, slot, self.generation[slot])
+
+
+    def write(self, data_dict, timeout=None):
+        """Copies a data_dict into a free slot, returns the frame descriptor.
+        Raises queue.Empty if no slot got free within timeout seconds."""
+        if shared_memory is None:
+            return {'data_dict': data_dict}
+        channels = {}
+        arrays = []
+        nbytes = 0
+        for chan_name, data in data_dict.items():
+            if isinstance(data, ivi.TraceYT):
+                # raw samples, the fit_worker applies the scaling
+                a = np.ascontiguousarray(data.y_raw)
+                scaling = dict((k, getattr(data, k)) for k in trace_scaling)
+            else:
+                a = np.ascontiguousarray(data, dtype=float)
+                scaling = None
+            channels[chan_name] = (a.dtype.str, a.shape, nbytes, scaling)
+            arrays.append((nbytes, a))
+            nbytes += a.nbytes + (-a.nbytes % 8)
+
+        if not self.free_slots.acquire(timeout=timeout):
+            raise queue.Empty
+        slot = self.busy[:].index(0)
+        self.busy[slot] = 1
+        shm = self.segments.get(slot)
+        if shm is None or self.size[slot] < nbytes:
+            if shm is not None:
+                close_segment(shm)
+                unlink_segment(shm)
+            self.generation[slot] += 1
+            shm = shared_memory.SharedMemory(self.name(slot), create=True,
+                                             size=max(nbytes, 1))
+            untrack_segment(shm)
+            self.segments[slot] = shm
+            self.size[slot] = shm.size
+
+        for offset, a in arrays:
+            np.ndarray(a.shape, a.dtype, buffer=shm.buf, offset=offset)[...] = a
+        return {'slot': slot, 'name': shm.name, 'time': time.time(),
+                'channels': channels}
+
+
+    def read(self, frame):
+        """Returns the data_dict of a frame descriptor. The waveforms are
+        views into the slot and are only valid until the frame is released."""
+        if shared_memory is None:
+            return frame['data_dict']
+        slot = frame['slot']
+        shm = self.segments.get(slot)
+        if shm is None or shm.name != frame['name']:
+            if shm is not None:
+                close_segment(shm)
+            shm = shared_memory.SharedMemory(frame['name'])
+            untrack_segment(shm)
+            self.segments[slot] = shm
+
+        data_dict = {}
+        for chan_name, (dtype, shape, offset, scaling) in frame['channels'].items():
+            a = np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+            a.setflags(write=False)
+            if scaling is None:
+                data_dict[chan_name] = a
+            else:
+                trace = ivi.TraceYT()
+                for k in scaling:
+                    setattr(trace, k, scaling[k])
+                trace.y_raw = a
+                data_dict[chan_name] = trace
+        return data_dict
+
+
+    def release(self, frame):
+        "Hands the slot of a processed frame back to io_worker"
+        if shared_memory is None:
+            return
+        self.busy[frame['slot']] = 0
+        self.free_slots.release()
+
+
+    def close(self):
+        "Removes all shared memory segments of the ring"
+        if shared_memory is None:
+            return
+        for shm in self.segments.values():
+            close_segment(shm)
+        self.segments = {}
+        for slot in range(self.slots):
+            if self.size[slot] == 0:
+                continue
+            try:
+                shm = shared_memory.SharedMemory(self.name(slot))
+            except FileNotFoundError:
+                continue
+            untrack_segment(shm)
+            shm.close()
+            unlink_segment(shm)
+
+
+def close_segment(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass # views still exist, the mapping goes away with them
+
+
+def untrack_segment(shm):
+    # The ring removes its segments in close(). Keep the resource tracker
+    # from unlinking them when a worker process exits.
+    if os.name == 'posix':
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+
+
+def unlink_segment(shm):
+    if os.name == 'posix':
+        # unlink() unregisters the segment from the resource tracker again
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+class acquisition_service():
+    """Process that owns the scope session. The scope is opened once and
+    kept open while sweeps, calibration and reference runs are started and
+    stopped by commands, so switching between them does not reconnect.
+    Frames are written into the ring, which lives as long as the service.
+    Frames of sweeps go into the fit_queue with the fit settings of the
+    sweep, others into the data_queue. Each frame carries the number of its
+    run. The service gets its settings with the commands, see
+    service_options, so it doesn't depend on the module globals of its
+    process."""
+    def __init__(self):
+        self.command_queue = Queue()
+        self.reply_queue = Queue()
+        self.fit_queue = frame_queue(ref_size, fit_queue_policy)
+        self.data_queue = frame_queue(ref_size)
+        # every queued frame and every frame being fitted holds a slot
+        self.ring = waveform_ring(2*ref_size + fit_processes*fit_batch + 1)
+        self.options = service_options()
+        self.requests = 0
+        self.process = Process(target=self.serve, daemon=True)
+        self.process.start()
+
+
+    def __getstate__(self):
+        # the service process gets the queues and the ring, not the process
+        state = self.__dict__.copy()
+        state.pop('process', None)
+        return state
+
+
+    def request(self, *command):
+        """Sends a command to the service and waits for its reply. Raises
+        IOError if the service process ended or didn't reply within
+        request_timeout seconds."""
+        self.requests += 1
+        self.command_queue.put((self.requests,) + command)
+        deadline = time.time() + request_timeout
+        while True:
+            try:
+                number, reply = self.reply_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise IOError("The acquisition service has ended.")
+                if time.time() > deadline:
+                    raise IOError("The acquisition service doesn't reply.")
+                continue
+            # replies to earlier requests that timed out are dropped
+            if number == self.requests:
+                break
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+    def open(self, scope_id):
+        "Opens the scope, if it isn't open already"
+        return self.request('open', scope_id)
+
+
+    def start(self, scope_id, channels, settings=None, segments=1):
+        """Starts reading the channels. With fit settings the frames go to
+        the fit_queue, else to the data_queue. With segments > 1 the scope
+        captures that many triggers per acquisition, each one becomes a
+        frame. Returns the run number."""
+        return self.request('start', scope_id, channels, settings, segments,
+                            service_options())
+
+
+    def stop(self):
+        "Stops reading, frames already queued stay there"
+        return self.request('stop')
+
+
+    def close(self):
+        "Closes the scope and ends the service"
+        if self.process.is_alive():
+            try:
+                self.request('close')
+            except IOError as exc:
+                print(exc)
+                self.process.terminate()
+            self.process.join()
+        self.ring.close()
+
+
+    def serve(self):
+        "Runs the commands from the command_queue, in the service process"
+        self.scope = None
+        self.scope_id = None
+        self.scope_failed = False
+        self.tuned = False
+        self.current_run = None
+        self.runs = 0
+        while True:
+            number, *command = self.command_queue.get()
+            try:
+                if command[0] == 'open':
+                    reply = self.open_scope(command[1])
+                elif command[0] == 'start':
+                    scope_id, channels, settings, segments, self.options = command[1:]
+                    self.stop_run()
+                    self.open_scope(scope_id)
+                    if not self.tuned:
+                        self.tune_usb(self.scope, channels, self.options['usb_tuning'])
+                        self.tuned = True
+                    reply = self.start_run(channels, settings, segments)
+                elif command[0] == 'stop':
+                    reply = self.stop_run()
+                elif command[0] == 'close':
+                    self.stop_run()
+                    if self.scope is not None:
+                        self.scope.close()
+                    self.reply_queue.put((number, None))
+                    return
+            except Exception as exc:
+                # driver and usb exceptions don't always survive pickling
+                reply = IOError("%s: %s" % (type(exc).__name__, exc))
+            self.reply_queue.put((number, reply))
+
+
+    def open_scope(self, scope_id):
+        """Opens the scope, unless it is open already. A scope that gave
+        USB errors is opened again, it may have been unplugged or
+        switched off and on."""
+        if (self.scope is not None and self.scope_id == scope_id
+                and not self.scope_failed):
+            return
+        self.stop_run()
+        if self.scope is not None:
+            try:
+                self.scope.close()
+            except Exception as exc:
+                print(exc)
+            self.scope = None
+        self.scope = get_scope(scope_id)
+        self.scope_id = scope_id
+        self.scope_failed = False
+        self.tuned = False
+
+
+    def start_run(self, channels, settings, segments=1):
+        self.runs += 1
+        if settings is None:
+            data_queue = self.data_queue
+            info = {'run': self.runs}
+        else:
+            data_queue = self.fit_queue
+            info = {'run': self.runs, 'settings': settings}
+        scope = self.scope
+        idV = scope._interface.idVendor
+        segments = self.setup_segments(scope, segments)
+        timer = stage_timer()
+        stopped = threading.Event()
+        frames = queue.Queue(2)
+        threads = [threading.Thread(target=self.read_frames, daemon=True,
+                       args=(scope, idV, channels, segments, frames, timer, stopped)),
+                   threading.Thread(target=self.io_worker, daemon=True,
+                       args=(frames, data_queue, info, timer, stopped))]
+        for thread in threads:
+            thread.start()
+        self.current_run = (stopped, threads)
+        return self.runs
+
+
+    def setup_segments(self, scope, segments):
+        """Sets the number of segments per acquisition, if the scope can do
+        segmented acquisition. Returns the number of segments used."""
+        if 'IviScopeSegmentedAcquisition' not in scope._identity_group_capabilities:
+            if segments > 1:
+                print("Scope has no segmented acquisition, one trigger per transfer.")
+            return 1
+        scope.acquisition.segment_count = segments
+        return segments
+
+
+    def stop_run(self):
+        if self.current_run is None:
+            return
+        stopped, threads = self.current_run
+        stopped.set()
+        for thread in threads:
+            thread.join()
+        self.current_run = None
+
+
+    def io_worker(self, frames, data_queue, info, timer, stopped):
+        """ Writes the frames read from the scope into the ring and puts the
+        frame descriptors, with info added, into the data_queue. The scope is read in a
+        thread of its own, so the next frame is transferred over USB while
+        the last one is copied into the ring and queued."""
+        while not stopped.is_set():
+            try:
+                data_dict = frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if isinstance(data_dict, Exception):
+                print(data_dict)
+                print("Acquisition stopped.")
+                return
+            start = time.perf_counter()
+            frame = None
+            while frame is None and not stopped.is_set():
+                try:
+                    frame = self.ring.write(data_dict, timeout=0.1)
+                except queue.Empty:
+                    pass
+            timer.add("ring write", start)
+            start = time.perf_counter()
+            if frame is None:
+                return
+            frame.update(info)
+            if not put_until(data_queue, frame, stopped, on_drop=self.ring.release):
+                # stopped before the frame was queued, free its slot
+                self.ring.release(frame)
+                return
+            timer.add("queue", start)
+            timer.count_frame()
+            interval = self.options['timing_interval']
+            if interval and timer.elapsed() > interval:
+                print(timer.report())
+                print("Frame queue: " + data_queue.report())
+                timer.reset()
+
+
+    def tune_usb(self, scope, channels, measure=False):
+        """ Sets the USB transfer size stored by usbtmc for this scope. With
+        measure, a scope without one is measured with waveform fetches of an
+        assigned channel, which blocks the start for a few seconds and
+        stores the result in the usbtmc tuning file."""
+        interface = scope._interface
+        if not isinstance(interface, usbtmc.Instrument):
+            return
+        tuning = interface.load_tuning()
+        if tuning is None:
+            chan_nums = [chan for chan in channels if channels[chan] != "nothing"]
+            if not measure or not chan_nums:
+                return
+            tuning = interface.tune(scope.channels[chan_nums[0]-1].measurement.fetch_waveform)
+        print("USB transfer size %d bytes: %.1f MB/s" % tuning)
+
+
+    def read_frames(self, scope, idV, channels, segments, frames, timer, stopped):
+        """Reads frames from the scope and puts the data_dicts into frames.
+        With segments > 1 every transfer gives one data_dict per segment.
+        After usb_error_limit USB errors in a row the run ends."""
+        errors = 0
+        try:
+            while not self.options['sim'] and not stopped.is_set():
+                fail = False
+                if idV == 0x0957: # Agilent scopes want to be initialized (tested for DSO7104B)
+                    start = time.perf_counter()
+                    scope.measurement.initiate()
+                    timer.add("initiate", start)
+                # all channels in one go, a single query where the scope can
+                chan_nums = [chan_num for chan_num in channels
+                             if channels[chan_num] != "nothing"]
+                start = time.perf_counter()
+                try:
+                    if segments > 1:
+                        traces = [scope.channels[chan_num-1].measurement.fetch_waveform_segments()
+                                  for chan_num in chan_nums]
+                    else:
+                        traces = [[data] for data in scope.measurement.fetch_waveforms(
+                            [chan_num-1 for chan_num in chan_nums])]
+                except USBError as exc:
+                    # reopen the scope with the next start
+                    self.scope_failed = True
+                    errors += 1
+                    if errors >= self.options['usb_error_limit']:
+                        raise
+                    print(exc)
+                    print("USB error. Try to keep going.")
+                    traces = []
+                    fail = True
+                else:
+                    errors = 0
+                timer.add("fetch", start)
+                for segment_traces in traces:
+                    if len(segment_traces) == 0 or any(len(data) == 0 for data in segment_traces):
+                        fail = True
+                if not fail:
+                    # one data_dict per segment, fitted like single frames
+                    data_dicts = [{} for data in traces[0]]
+                    for chan_num, segment_traces in zip(chan_nums, traces):
+                        for data_dict, data in zip(data_dicts, segment_traces):
+                            data_dict[channels[chan_num]] = data
+                    start = time.perf_counter()
+                    for data_dict in data_dicts:
+                        if not put_until(frames, data_dict, stopped):
+                            break
+                    timer.add("wait", start)
+        except Exception as exc:
+            self.scope_failed = True
+            put_until(frames, exc, stopped)
+
+
+def put_until(q, item, stopped, timeout=0.1, **kwargs):
+    """Puts item into q unless stopped is set first. Returns whether it was
+    put. kwargs go to q.put."""
+    while not stopped.is_set():
+        try:
+            q.put(item, timeout=timeout, **kwargs)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class fit_pool():
+    """Fit processes that live as long as the application. They take the
+    frames of all sweeps from the data_queue and fit them with the settings
+    each frame carries, so starting a sweep doesn't start processes."""
+    def __init__(self, data_queue, ring, processes):
+        self.data_queue = data_queue
+        self.process_list = []
+        for i in range(processes):
+            fit_process = Process(target=fit_worker, daemon=True,
+                args=(data_queue, ring, result_queue, fit_batch))
+            fit_process.start()
+            self.process_list.append(fit_process)
+
+
+    def close(self, timeout=2):
+        """Stops the fit processes once they have fitted the frames queued
+        so far. Processes still busy after timeout seconds are terminated,
+        e.g. when nobody takes their results."""
+        end = time.perf_counter() + timeout
+        try:
+            self.data_queue.stop_consumers(len(self.process_list), timeout)
+        except queue.Full:
+            pass
+        for fit_process in self.process_list:
+            fit_process.join(max(end - time.perf_counter(), 0))
+            if fit_process.is_alive():
+                fit_process.terminate()
+        self.process_list = []
+
+
+acquisition = None # acquisition_service, see start_services
+fits = None # fit_pool
+
+def service_options():
+    """The settings of the acquisition service, sent with every start, so
+    changes reach the service process"""
+    return {'sim': sim, 'usb_tuning': usb_tuning,
+            'usb_error_limit': usb_error_limit,
+            'timing_interval': timing_interval}
+
+def start_services():
+    """Starts the acquisition service and the fit pool, if they aren't
+    running. They are kept until the application quits."""
+    global acquisition, fits, result_queue
+    if acquisition is None:
+        if result_queue is None:
+            result_queue = frame_queue(100, result_queue_policy)
+        acquisition = acquisition_service()
+        fits = fit_pool(acquisition.fit_queue, acquisition.ring, fit_processes)
+
+
+def close_services():
+    global acquisition, fits
+    if acquisition is not None:
+        acquisition.stop()
+    if fits is not None:
+        fits.close()
+        fits = None
+    if acquisition is not None:
+        acquisition.close()
+        acquisition = None
+
+
 class sweeper():
     def __init__(self, channels, volcal, resistance, v_ref, c_ref):
-        global result_queue
-        mgr = multiprocessing.Manager()
+        start_services()
         self.channels = channels
+        self.segments = segments
         self.volcal = volcal
         self.resistance = resistance
         self.v_ref = v_ref
         self.c_ref = c_ref
-        self.data_queue = mgr.Queue(ref_size)
-        self.io_process = Process(target=self.io_worker, args=(self.data_queue, scope_id))
-        self.fit_process_list = []
-        for i in range(cpu_count()-1):
-            this_fit_proccess = Process(target=fit_worker,
-                args=(self.data_queue, result_queue, volcal, resistance, v_ref, c_ref, power_method))
-
-            self.fit_process_list.append(this_fit_proccess)
+        self.settings = {'volcal': volcal, 'resistance': resistance,
+                         'v_ref': v_ref, 'c_ref': c_ref,
+                         'method': power_method, 'engine': fit_engine}
+        self.acquisition = acquisition
+        self.ring = acquisition.ring
+        self.data_queue = acquisition.data_queue
+        self.run = None
     
     
     def start(self):
-        if not self.io_process.is_alive():
-            self.io_process.start()
-        for fit_process in self.fit_process_list:
-            if not fit_process.is_alive():
-                fit_process.start()
+        "Starts a sweep, the frames are fitted by the fit pool"
+        self.acquisition.start(scope_id, self.channels, self.settings, self.segments)
         
         
     def stop(self):
-        if self.io_process.is_alive():
-            self.io_process.terminate()
-        for fit_process in self.fit_process_list:
-            while not self.data_queue.empty() and fit_process.is_alive():
-                time.sleep(1)
-            if fit_process.is_alive():
-                fit_process.terminate()
-            while not self.data_queue.empty():
-                self.data_queue.get()
+        self.acquisition.stop()
+
+
+    def read(self):
+        """Starts reading into the data_queue, if not started yet. Returns
+        the next frame and its data_dict, frames of earlier runs are dropped."""
+        if self.run is None:
+            self.run = self.acquisition.start(scope_id, self.channels, segments=self.segments)
+        while True:
+            frame = self.data_queue.get()
+            if frame['run'] == self.run:
+                return frame, self.ring.read(frame)
+            self.ring.release(frame)
+
+
+    def finish(self):
+        "Stops reading into the data_queue and drops the frames left over"
+        self.acquisition.stop()
+        self.run = None
+        while True:
+            try:
+                self.ring.release(self.data_queue.get_nowait())
+            except queue.Empty:
+                break
     
 
     def calibrate(self):
         global volcal, volcal_std
-        ref_queue = Queue(ref_size*2) # Don't ask
-        self.io_process.start()
         volcal_list = []
         for i in range(ref_size):
-            data_dict = self.data_queue.get()
+            frame, data_dict = self.read()
             try:
                 external_voltage_data = data_dict["calibration voltage"]
             except KeyError:
                 print("Channel 'calibration voltage' not set.")
                 volcal_std = "Error, 'calibration voltage' channel not set."
-                self.io_process.terminate()
+                self.ring.release(frame)
+                self.finish()
                 return 0
             voltage_data = data_dict["voltage"]
-            v_amp, v_freq, v_phase = fit_func(voltage_data)
-            ext_v_amp, ext_v_freq, ext_v_phase = fit_func(external_voltage_data)
+            ((v_amp, v_freq, v_phase), (ext_v_amp, ext_v_freq, ext_v_phase)) = fit_pair(
+                voltage_data, external_voltage_data, fit_engine)
             volcal_list.append(ext_v_amp/v_amp)
+            self.ring.release(frame)
 
-        self.io_process.terminate()
-        while not self.data_queue.empty():
-            self.data_queue.get()
+        self.finish()
 
         volcal = np.average(volcal_list)
         volcal_std = np.std(volcal_list)
@@ -583,22 +1378,19 @@ class sweeper():
     
 
     def find_ref(self):
-        ref_queue = Queue(ref_size*2) # Don't ask
-        self.io_process.start()
         v_phases = []
         c_phases = []
         for i in range(ref_size):
-            data_dict = self.data_queue.get()
+            frame, data_dict = self.read()
             voltage_data = data_dict["voltage"]
-            v_amp, v_freq, v_phase = fit_func(voltage_data)
             current_data = data_dict["current"]
-            c_amp, c_freq, c_phase = fit_func(current_data)
+            ((v_amp, v_freq, v_phase), (c_amp, c_freq, c_phase)) = fit_pair(
+                voltage_data, current_data, fit_engine)
             v_phases.append(v_phase)
             c_phases.append(c_phase)
+            self.ring.release(frame)
 
-        self.io_process.terminate()
-        while not self.data_queue.empty():
-            self.data_queue.get()
+        self.finish()
 
         # Getting the average of an angle is hard:
         # https://en.wikipedia.org/wiki/Mean_of_circular_quantities
@@ -631,98 +1423,217 @@ class sweeper():
         current_ref_phase_std = c_phase_std
         self.v_ref = voltage_ref_phase
         self.c_ref = current_ref_phase
-        return (voltage_ref_phase, current_ref_phase, voltage_ref_phase_std, current_ref_phase_std) 
-        
+        return (voltage_ref_phase, current_ref_phase, voltage_ref_phase_std, current_ref_phase_std)
+
+
+class stage_timer():
+    """Collects the time spent in each stage of the acquisition, to see
+    where the frame time goes."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self.lock:
+            self.start = time.perf_counter()
+            self.frames = 0
+            self.total = {}
+            self.calls = {}
+
+
+    def add(self, stage, start):
+        "Adds the time since start (a time.perf_counter() value) to a stage"
+        duration = time.perf_counter() - start
+        with self.lock:
+            self.total[stage] = self.total.get(stage, 0) + duration
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+
+    def count_frame(self):
+        with self.lock:
+            self.frames += 1
+
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+    def report(self):
+        "Frame rate and mean time per call of each stage"
+        with self.lock:
+            stages = ", ".join("%s %.1f ms" % (stage, 1e3*self.total[stage]/self.calls[stage])
+                               for stage in self.total)
+            return "%.2f frames/s: %s" % (self.frames/self.elapsed(), stages)
+
+
+def fit_worker(data_queue, ring, result_queue, batch=1):
+    """Takes data_queue and fits a sinus. Puts lists of 4-tuples of voltage,
+    current, phaseshift and power into the result_queue. Up to batch frames
+    waiting in the data_queue are processed together, if their fit is
+    batched (see batched_fit), else one at a time so the other processes
+    share the work. Frames whose fit fails are skipped. Returns after
+    taking a None sentinel."""
+    warm_up()
+    stop = False
+    while not stop:
+        frames = [data_queue.get()]
+        while (len(frames) < batch and frames[-1] is not None
+               and batched_fit(**frames[0]['settings'])):
+            try:
+                frames.append(data_queue.get_nowait())
+            except queue.Empty:
+                break
+        if frames[-1] is None:
+            stop = True
+            frames.pop()
+
+        # frames of different sweeps can come with different settings
+        for settings, group in itertools.groupby(frames, lambda frame: frame['settings']):
+            group = list(group)
+            try:
+                data_dicts = [ring.read(frame) for frame in group]
+                results = fit_group(data_dicts, settings)
+            finally:
+                for frame in group:
+                    ring.release(frame)
+            if results:
+                result_queue.put(results)
+
+
+def fit_group(data_dicts, settings):
+    """Fits the data_dicts together. If that fails they are fitted one at a
+    time, so only the frames that can't be fitted are skipped."""
+    try:
+        return fit_frames(data_dicts, **settings)
+    except Exception as exc:
+        if len(data_dicts) == 1:
+            print(exc)
+            print("Fit failed, frame skipped.")
+            return []
+    results = []
+    for data_dict in data_dicts:
+        try:
+            results.extend(fit_frames([data_dict], **settings))
+        except Exception as exc:
+            print(exc)
+            print("Fit failed, frame skipped.")
+    return results
+
+
+def batched_fit(method='phaseshift', engine='leastsq', **settings):
+    "Whether fit_frames fits several frames at once with these settings"
+    return method == 'phaseshift' and engine == 'sine3'
+
+
+def fit_frames(data_dicts, volcal, resistance, v_ref, c_ref, method='phaseshift', engine='leastsq'):
+    if batched_fit(method, engine) and len(data_dicts) > 1:
+        return phaseshift_batch(data_dicts, volcal, resistance, v_ref, c_ref)
+    elif method == 'phaseshift':
+        return [phaseshift_power(data_dict, volcal, resistance, v_ref, c_ref, engine)
+                for data_dict in data_dicts]
+    elif method == 'integration':
+        return [integration_power(data_dict, volcal, resistance, v_ref, c_ref)
+                for data_dict in data_dicts]
+
+
+def warm_up():
+    """Runs every fit once on a test signal, so the first frames of a sweep
+    don't wait for lazy imports and first call setup in numpy and scipy."""
+    t = np.arange(1000) * 1e-9
+    data = np.column_stack((t, np.sin(2*np.pi*13.56e6*t)))
+    data_dict = {"voltage": data, "current": data}
+    for engine in fit_engines:
+        fit_frames([data_dict], 1, 1, 0, 0, 'phaseshift', engine)
+    fit_frames([data_dict, data_dict], 1, 1, 0, 0, 'phaseshift', 'sine3')
+    fit_frames([data_dict], 1, 1, 0, 0, 'integration')
+
+
+def phaseshift_power(data_dict, volcal, resistance, v_ref, c_ref, engine='leastsq'):
+    ((v_amp, v_freq, v_phase), (c_amp, c_freq, c_phase)) = fit_pair(
+        data_dict["voltage"], data_dict["current"], engine)
+    voltage_rms = v_amp/np.sqrt(2) * volcal
+    current_rms = c_amp/np.sqrt(2)/resistance
+
+    phaseshift = np.pi/2 + (c_ref - c_phase) - (v_ref - v_phase)
+    power = voltage_rms * current_rms * np.absolute(np.cos(phaseshift))
+    return (voltage_rms, current_rms, phaseshift, power)
+
+
+def phaseshift_batch(data_dicts, volcal, resistance, v_ref, c_ref):
+    """phaseshift_power with the sine3 engine for a list of frames. Records
+    of the same length are stacked and fitted at once by sine_fit_batch."""
+    results = [None] * len(data_dicts)
+    groups = {}
+    for i, data_dict in enumerate(data_dicts):
+        voltage_data = np.asarray(data_dict["voltage"])
+        current_data = np.asarray(data_dict["current"])
+        key = (len(voltage_data), len(current_data))
+        groups.setdefault(key, []).append((i, voltage_data, current_data))
+
+    for group in groups.values():
+        voltage_data = np.nan_to_num(np.stack([g[1] for g in group]))
+        v_amp, v_freq, v_phase = sine_fit_batch(voltage_data[:,:,0], voltage_data[:,:,1])
+        voltage_rms = v_amp/np.sqrt(2) * volcal
+
+        current_data = np.nan_to_num(np.stack([g[2] for g in group]))
+        c_amp, c_freq, c_phase = sine_fit_batch(current_data[:,:,0], current_data[:,:,1])
+        current_rms = c_amp/np.sqrt(2)/resistance
+
+        phaseshift = np.pi/2 + (c_ref - c_phase) - (v_ref - v_phase)
+        power = voltage_rms * current_rms * np.absolute(np.cos(phaseshift))
+        for j, g in enumerate(group):
+            results[g[0]] = (voltage_rms[j], current_rms[j], phaseshift[j], power[j])
+    return results
+
+
+def integration_power(data_dict, volcal, resistance, v_ref, c_ref):
+    data = np.asarray(data_dict["voltage"])
+    t = np.nan_to_num(data[:,0])
+    U = np.nan_to_num(data[:,1])
     
-    def io_worker(self, data_queue, scope_id):
-        """ Gets waveforms from the scope and puts them into the data_queue."""
-        device = usbtmc.Instrument(scope_id)
-        idV = device.idVendor
-        device.close()
-        scope = get_scope(scope_id)
-
-        while True and not sim:
-            fail = False
-            data_dict = {}
-            if idV == 0x0957: # Agilent scopes want to be initialized (tested for DSO7104B)
-                scope.measurement.initiate()
-            for chan_num in self.channels:
-                chan_name = self.channels[chan_num]
-                if chan_name != "nothing":
-                    try:
-                        data = scope.channels[chan_num-1].measurement.fetch_waveform()
-                    except USBError as exc:
-                        print(exc)
-                        print("USB error. Try to keep going.")
-                        fail = True
-                    if len(data) > 0:
-                        data_dict[chan_name] = data
-                    else:
-                        fail = True
-            if not fail:
-                data_queue.put(data_dict)
-
-
-def fit_worker(data_queue, result_queue, volcal, resistance, v_ref, c_ref, method='phaseshift'):
-    """Takes data_queue and fits a sinus. Returns 4-tuple of voltage,current, 
-    phaseshift and power """
-    while True:
-        data_dict = data_queue.get()
-        voltage_data = data_dict["voltage"]
-        current_data = data_dict["current"]
-
-        if method == 'phaseshift':
-            v_amp, v_freq, v_phase = fit_func(voltage_data)
-            voltage_rms = v_amp/np.sqrt(2) * volcal
-
-            c_amp, c_freq, c_phase = fit_func(current_data)
-            current_rms = c_amp/np.sqrt(2)/resistance
-
-            phaseshift = np.pi/2 + (c_ref - c_phase) - (v_ref - v_phase)
-            power = voltage_rms * current_rms * np.absolute(np.cos(phaseshift))
-            result = (voltage_rms, current_rms, phaseshift, power)
-            result_queue.put(result)
-        
-        if method == 'integration':
-            data = np.array(voltage_data)
-            t = np.nan_to_num(data[:,0])
-            U = np.nan_to_num(data[:,1])
-            
-            data = np.array(current_data)
-            t = np.nan_to_num(data[:,0])
-            I = np.nan_to_num(data[:,1])
-            dt = t[1] - t[0]
-
-            spectrum = np.fft.fft(U)
-            freq = np.fft.fftfreq(len(spectrum))/dt
-            frequency = np.abs(freq[np.argmax(abs(spectrum))])
-            
-            T = 1/frequency
-            dT = t[-1]-t[0]
-            cut_t = int(dT/T)*T + t[0]
-            I = I[t<cut_t] / resistance
-            U = U[t<cut_t] * volcal
-            t = t[t<cut_t]
-            dT = t[-1]-t[0]
-            
-            shift0 = np.pi/2 + c_ref - v_ref
-            roll_num = int(shift0/(frequency*2*np.pi)/dt)
-            U = np.roll(U, -roll_num)
-            power = np.abs(simpson(U*I, t)/dT)
-            voltage_rms = np.sqrt(1/dT*simpson(U**2, t))
-            current_rms = np.sqrt(1/dT*simpson(I**2, t))
-            phaseshift = 0
-            phaseshift = np.arccos(power /( voltage_rms * current_rms)) 
-            
-            result = (voltage_rms, current_rms, phaseshift, power)
-            result_queue.put(result)
-
-
-
-def fit_func(data):
-    data = np.array(data)
+    data = np.asarray(data_dict["current"])
+    t = np.nan_to_num(data[:,0])
+    I = np.nan_to_num(data[:,1])
+    dt = t[1] - t[0]
+
+    spectrum = np.fft.fft(U)
+    freq = np.fft.fftfreq(len(spectrum))/dt
+    frequency = np.abs(freq[np.argmax(abs(spectrum))])
+    
+    T = 1/frequency
+    dT = t[-1]-t[0]
+    cut_t = int(dT/T)*T + t[0]
+    I = I[t<cut_t] / resistance
+    U = U[t<cut_t] * volcal
+    t = t[t<cut_t]
+    dT = t[-1]-t[0]
+    
+    shift0 = np.pi/2 + c_ref - v_ref
+    roll_num = int(shift0/(frequency*2*np.pi)/dt)
+    U = np.roll(U, -roll_num)
+    power = np.abs(simpson(U*I, t)/dT)
+    voltage_rms = np.sqrt(1/dT*simpson(U**2, t))
+    current_rms = np.sqrt(1/dT*simpson(I**2, t))
+    phaseshift = 0
+    phaseshift = np.arccos(power /( voltage_rms * current_rms)) 
+    
+    return (voltage_rms, current_rms, phaseshift, power)
+
+
+def fit_func(data, engine='leastsq'):
+    """Fits a sine to waveform data. Returns amplitude, frequency and phase.
+    engine is one of fit_engines: 'leastsq' (nonlinear fit, slow),
+    'sine3' (interpolated FFT frequency, linear fit of amplitude and phase)
+    or 'sine4' (sine3 refined by IEEE 1057 four parameter iterations).
+    'cross' fits pairs of channels at a common frequency in fit_pair."""
+    data = np.asarray(data)
     time = np.nan_to_num(data[:,0])
     amplitude = np.nan_to_num(data[:,1])
+    return fit_engines[engine](time, amplitude)
+
+
+def leastsq_fit(time, amplitude):
     guess_mean = np.mean(amplitude)
     guess_amplitude = np.amax(amplitude)
     guess_phase = 0
@@ -745,10 +1656,127 @@ def fit_func(data):
         est_ampl = np.abs(est_ampl)
         est_phase = est_phase + np.pi
     return (est_ampl, est_freq, est_phase%(2*np.pi))
-  
+
+
+def peak_bin(spectrum):
+    """Position of the largest peak of magnitude spectra along the last
+    axis, interpolated between the bins of a Hann windowed signal."""
+    k = np.argmax(spectrum[...,1:-1], axis=-1)[...,None] + 1
+    left, peak, right = (np.take_along_axis(spectrum, k + i, axis=-1)[...,0]
+                         for i in (-1, 0, 1))
+    # for a Hann window, the ratio r of the larger neighbour to the peak
+    # bin gives the offset from the peak bin as (2r - 1)/(r + 1)
+    sign = np.where(right > left, 1, -1)
+    r = np.maximum(left, right)/peak
+    return k[...,0] + sign*(2*r - 1)/(r + 1)
+
+
+def fft_frequency(time, amplitude):
+    """Frequency of the strongest line in the spectrum, interpolated
+    between the FFT bins of the Hann windowed signal. 2-D arrays give the
+    frequency of each row."""
+    n = amplitude.shape[-1]
+    window = np.hanning(n)
+    mean = np.mean(amplitude, axis=-1, keepdims=True)
+    spectrum = np.abs(np.fft.rfft((amplitude - mean) * window, axis=-1))
+    frequency = peak_bin(spectrum)/(n * (time[...,1] - time[...,0]))
+    return frequency[()]
+
+
+def sine_fit(time, amplitude, iterations=0):
+    """Linear least squares sine fit (IEEE 1057) at the interpolated FFT
+    frequency. With iterations > 0 the frequency is refined by four
+    parameter fits first."""
+    omega = 2*np.pi*fft_frequency(time, amplitude)
+    ones = np.ones_like(time)
+    for i in range(iterations):
+        s, c = np.sin(omega*time), np.cos(omega*time)
+        if i == 0:
+            a, b, y0 = np.linalg.lstsq(np.column_stack((s, c, ones)),
+                                       amplitude, rcond=None)[0]
+        # linearized dependence on the frequency
+        dw = time*(a*c - b*s)
+        a, b, y0, d_omega = np.linalg.lstsq(np.column_stack((s, c, ones, dw)),
+                                            amplitude, rcond=None)[0]
+        omega = omega + d_omega
+    s, c = np.sin(omega*time), np.cos(omega*time)
+    a, b, y0 = np.linalg.lstsq(np.column_stack((s, c, ones)),
+                               amplitude, rcond=None)[0]
+    # a sin(wt) + b cos(wt) = sqrt(a^2 + b^2) sin(wt + atan2(b, a))
+    return (np.hypot(a, b), omega/(2*np.pi), np.arctan2(b, a)%(2*np.pi))
+
+
+def sine_fit_batch(time, amplitude):
+    """sine3 fit of each row of 2-D time and amplitude arrays, solved for all
+    rows at once through the normal equations. Returns arrays of amplitude,
+    frequency and phase."""
+    omega = 2*np.pi*fft_frequency(time, amplitude)
+    wt = omega[:,None]*time
+    basis = np.stack((np.sin(wt), np.cos(wt), np.ones_like(time)), axis=1)
+    normal = np.matmul(basis, basis.transpose(0, 2, 1))
+    projection = np.matmul(basis, amplitude[:,:,None])
+    a, b, y0 = np.linalg.solve(normal, projection)[:,:,0].T
+    return (np.hypot(a, b), omega/(2*np.pi), np.arctan2(b, a)%(2*np.pi))
+
+
+def cross_spectrum_fit(time, amplitude1, amplitude2):
+    """Fits sines of one common frequency to two channels sampled at the
+    same times. Both channels go through one complex FFT and the frequency
+    is interpolated from their cross spectrum. Amplitudes and phases of
+    both come from one linear least squares solve. Returns two tuples of
+    amplitude, frequency and phase."""
+    n = len(time)
+    window = np.hanning(n)
+    z = ((amplitude1 - np.mean(amplitude1))
+         + 1j*(amplitude2 - np.mean(amplitude2))) * window
+    spectrum = np.fft.fft(z)
+    # the spectra of the real and imaginary part of z are the conjugate
+    # even and odd parts of its spectrum, Z[k] +- conj(Z[N-k])
+    mirrored = np.conj(spectrum[-np.arange(n//2 + 1)])
+    spectrum = spectrum[:n//2 + 1]
+    spectrum1 = (spectrum + mirrored)/2
+    spectrum2 = (spectrum - mirrored)/2j
+    cross = np.sqrt(np.abs(spectrum1 * np.conj(spectrum2)))
+    omega = 2*np.pi*peak_bin(cross)/(n * (time[1] - time[0]))
+
+    basis = np.column_stack((np.sin(omega*time), np.cos(omega*time),
+                             np.ones_like(time)))
+    a, b, y0 = np.linalg.lstsq(basis, np.column_stack((amplitude1, amplitude2)),
+                               rcond=None)[0]
+    frequency = omega/(2*np.pi)
+    return tuple((np.hypot(a[i], b[i]), frequency, np.arctan2(b[i], a[i])%(2*np.pi))
+                 for i in range(2))
+
+
+def fit_pair(data1, data2, engine='leastsq'):
+    """Fits sines to two channels with fit_func. The 'cross' engine fits
+    both at once with cross_spectrum_fit if they share the time axis."""
+    if engine == 'cross':
+        data1 = np.asarray(data1)
+        data2 = np.asarray(data2)
+        time = np.nan_to_num(data1[:,0])
+        if (len(data1) == len(data2) and np.allclose(time, np.nan_to_num(data2[:,0]),
+                rtol=0, atol=0.01*np.abs(time[1] - time[0]))):
+            return cross_spectrum_fit(time, np.nan_to_num(data1[:,1]),
+                                      np.nan_to_num(data2[:,1]))
+    return fit_func(data1, engine), fit_func(data2, engine)
+
+
+def sine4_fit(time, amplitude):
+    return sine_fit(time, amplitude, iterations=3)
+
+
+fit_engines = {
+    'leastsq': leastsq_fit,
+    'sine3': sine_fit,
+    'sine4': sine4_fit,
+    'cross': sine_fit} # single channels, see fit_pair
+
 
 def run():
+    start_services()
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(close_services)
     this_main_window = main_window()
     sys.exit(app.exec_())
 
@@ -26,7 +26,7 @@ THE SOFTWARE.
 
 from .agilentBaseScope import *
 
-class agilentBaseInfiniiVision(agilentBaseScope):
+class agilentBaseInfiniiVision(agilentBaseScope, scope.SegmentedAcquisition):
     "Agilent InfiniiVision series IVI oscilloscope driver"
     
     def __init__(self, *args, **kwargs):
@@ -54,3 +54,34 @@ class agilentBaseInfiniiVision(agilentBaseScope):
         self._init_channels()
     
     
+    
+    def _get_acquisition_segment_count(self):
+        if self._get_acquisition_sample_mode() != 'segmented':
+            return 1
+        return self._get_acquisition_segmented_count()
+    
+    def _set_acquisition_segment_count(self, value):
+        value = int(value)
+        if value < 1:
+            raise ivi.OutOfRangeException()
+        if value > 1:
+            self._set_acquisition_sample_mode('segmented')
+            self._set_acquisition_segmented_count(value)
+        elif self._get_acquisition_sample_mode() == 'segmented':
+            self._set_acquisition_sample_mode('real_time')
+    
+    def _measurement_fetch_waveform_segments(self, index):
+        """Per segment fallback: :waveform:data? only returns the segment
+        selected with acquisition.segmented.index, so every segment is
+        selected and transferred on its own. The number of transfers is the
+        same as without segments, only the acquisition is done once for all
+        of them."""
+        index = ivi.get_index(self._channel_name, index)
+        count = self._get_acquisition_segment_count()
+        
+        segments = list()
+        for i in range(count):
+            if count > 1:
+                self._set_acquisition_segmented_index(i+1)
+            segments.append(self._measurement_fetch_waveform(index))
+        return segments
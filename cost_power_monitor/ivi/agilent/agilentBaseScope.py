@@ -24,10 +24,11 @@ THE SOFTWARE.
 
 """
 
-import array
 import sys
 import time
 
+import numpy as np
+
 from .. import ivi
 from .. import scope
 from .. import scpi
@@ -210,6 +211,7 @@ class agilentBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.comm
         self._timebase_window_position = 0.0
         self._timebase_window_range = 5e-6
         self._timebase_window_scale = 500e-9
+        self._waveform_source = 0
         self._display_screenshot_image_format_mapping = ScreenshotImageFormatMapping
         self._display_vectors = True
         self._display_labels = True
@@ -1339,13 +1341,18 @@ class agilentBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.comm
         if self._driver_operation_simulate:
             return ivi.TraceYT()
 
-        self._write(":waveform:source %s" % self._channel_name[index])
-        if sys.byteorder == 'little':
-            self._write(":waveform:byteorder lsbfirst")
-        else:
-            self._write(":waveform:byteorder msbfirst")
-        self._write(":waveform:unsigned 1")
-        self._write(":waveform:format word")
+        if not self._get_cache_valid('waveform_source') or self._waveform_source != index:
+            self._write(":waveform:source %s" % self._channel_name[index])
+            self._waveform_source = index
+            self._set_cache_valid(True, 'waveform_source')
+        if not self._get_cache_valid('waveform_format'):
+            if sys.byteorder == 'little':
+                self._write(":waveform:byteorder lsbfirst")
+            else:
+                self._write(":waveform:byteorder msbfirst")
+            self._write(":waveform:unsigned 1")
+            self._write(":waveform:format word")
+            self._set_cache_valid(True, 'waveform_format')
 
         trace = ivi.TraceYT()
 
@@ -1375,7 +1382,7 @@ class agilentBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.comm
         self._read_raw() # flush buffer
 
         # Store in trace object
-        trace.y_raw = array.array('H', raw_data[0:points*2])
+        trace.y_raw = np.frombuffer(raw_data[0:points*2], dtype='H')
 
         return trace
     
@@ -0,0 +1,93 @@
+"""
+
+Python Interchangeable Virtual Instrument Library
+
+Copyright (c) 2014-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import io
+import unittest
+
+from ... import ivi
+from .. import agilentMSOX3014A
+
+class VirtualMSOX3014A(object):
+    def __init__(self):
+        self.read_buffer = io.BytesIO()
+        self.cmd_log = list()
+
+        self.mode = 'RTIM'
+        self.segment_count = 2
+
+    def write_raw(self, data):
+        cmd = data.decode().strip().lower()
+        self.cmd_log.append(cmd)
+        response = None
+
+        if cmd.startswith(':acquire:mode '):
+            self.mode = cmd.split(' ')[1].upper()
+        elif cmd.startswith(':acquire:segmented:count '):
+            self.segment_count = int(cmd.split(' ')[1])
+        elif cmd == ':acquire:mode?':
+            response = self.mode
+        elif cmd == ':acquire:segmented:count?':
+            response = str(self.segment_count)
+
+        if response is not None:
+            self.read_buffer = io.BytesIO(response.encode() + b'\n')
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+
+class TestAgilentMSOX3014A(unittest.TestCase):
+
+    def setUp(self):
+        self.vscope = VirtualMSOX3014A()
+        self.scope = agilentMSOX3014A(self.vscope)
+
+    def test_segment_count(self):
+        self.assertEqual(self.scope.acquisition.segment_count, 1)
+        self.scope.acquisition.segment_count = 4
+        self.assertEqual(self.vscope.cmd_log[-2:], [':acquire:mode segm', ':acquire:segmented:count 4'])
+        self.assertEqual(self.vscope.segment_count, 4)
+        # both properties share the segmented count and its cache
+        self.vscope.cmd_log = []
+        self.assertEqual(self.scope.acquisition.segment_count, 4)
+        self.assertEqual(self.scope.acquisition.segmented.count, 4)
+        self.assertEqual(self.vscope.cmd_log, [])
+        self.scope.acquisition.segmented.count = 8
+        self.assertEqual(self.scope.acquisition.segment_count, 8)
+        self.scope.driver_operation.invalidate_all_attributes()
+        self.assertEqual(self.scope.acquisition.segment_count, 8)
+        self.assertTrue(':acquire:segmented:count?' in self.vscope.cmd_log)
+
+    def test_segment_count_off(self):
+        self.scope.acquisition.segment_count = 4
+        self.scope.acquisition.segment_count = 1
+        self.assertEqual(self.vscope.mode, 'RTIM')
+        self.assertEqual(self.scope.acquisition.segment_count, 1)
+        self.assertRaises(ivi.OutOfRangeException, setattr, self.scope.acquisition, 'segment_count', 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
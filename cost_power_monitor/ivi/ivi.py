@@ -25,9 +25,9 @@ THE SOFTWARE.
 """
 
 # import libraries
-import inspect
 import numpy as np
 import re
+import sys
 from functools import partial
 
 # try importing drivers
@@ -74,6 +74,9 @@ def set_prefer_pyvisa(value=True):
     global _prefer_pyvisa
     _prefer_pyvisa = bool(value)
 
+# cache tags by method name, see Driver._get_cache_tag
+_cache_tags = dict()
+
 # version information
 from .version import __version__
 version = __version__
@@ -137,31 +140,78 @@ def get_index_dict(l):
     return d
 
 
+class ManagedProperty(object):
+    "Data descriptor calling the getter, setter and deleter of a managed property"
+    __slots__ = ('fget', 'fset', 'fdel')
+
+    def __init__(self, fget=None, fset=None, fdel=None):
+        self.fget = fget
+        self.fset = fset
+        self.fdel = fdel
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if self.fget is None:
+            raise AttributeError("unreadable attribute")
+        return self.fget()
+
+    def __set__(self, obj, value):
+        if self.fset is None:
+            raise AttributeError("can't set attribute")
+        self.fset(value)
+
+    def __delete__(self, obj):
+        if self.fdel is None:
+            raise AttributeError("can't delete attribute")
+        self.fdel()
+
+
 class PropertyCollection(object):
-    "A building block to create hierarchical trees of methods and properties"
+    """A building block to create hierarchical trees of methods and properties
+
+    Managed properties are bound to their object, so each object gets a
+    class of its own on the first _add_property and the properties are
+    stored there as ManagedProperty descriptors.  Attribute access then
+    takes the normal Python paths without a __getattribute__ hook."""
+    _locked = False
+
     def __init__(self):
         d = object.__getattribute__(self, '__dict__')
         d.setdefault('_props', dict())
         d.setdefault('_docs', dict())
         d.setdefault('_locked', False)
+
+    def _own_class(self):
+        "Return the class of this object only, creating it when needed"
+        cls = type(self)
+        if '_own_class_of' not in cls.__dict__:
+            cls = type(cls.__name__, (cls,), {'_own_class_of': cls,
+                    '__module__': cls.__module__, '__qualname__': cls.__qualname__,
+                    '__doc__': cls.__doc__})
+            object.__setattr__(self, '__class__', cls)
+        return cls
     
     def _add_property(self, name, fget=None, fset=None, fdel=None, doc=None):
         "Add a managed property"
         d = object.__getattribute__(self, '__dict__')
-        d['_props'][name] = (fget, fset, fdel)
-        d['_docs'][name] = doc
+        d.setdefault('_props', dict())[name] = (fget, fset, fdel)
+        d.setdefault('_docs', dict())[name] = doc
         d[name] = None
+        setattr(self._own_class(), name, ManagedProperty(fget, fset, fdel))
     
     def _add_method(self, name, f=None, doc=None):
         "Add a managed method"
         d = object.__getattribute__(self, '__dict__')
-        d['_docs'][name] = doc
+        d.setdefault('_docs', dict())[name] = doc
         d[name] = f
     
     def _del_property(self, name):
         "Remove managed property or method"
         d = object.__getattribute__(self, '__dict__')
-        del d['_props'][name]
+        if name in d['_props']:
+            del d['_props'][name]
+            delattr(self._own_class(), name)
         del d['_docs'][name]
         del d[name]
     
@@ -174,44 +224,13 @@ class PropertyCollection(object):
         "Unlock object to allow creation or deletion of unmanaged members, equivalent to _lock(False)"
         self._lock(False)
         
-    def __getattribute__(self, name):
-        if name == '__dict__':
-            return object.__getattribute__(self, name)
-        d = object.__getattribute__(self, '__dict__')
-        d.setdefault('_props', dict())
-        d.setdefault('_locked', False)
-        if name in d['_props']:
-            f = d['_props'][name][0]
-            if f is None:
-                raise AttributeError("unreadable attribute")
-            return f()
-        return object.__getattribute__(self, name)
-        
     def __setattr__(self, name, value):
-        d = object.__getattribute__(self, '__dict__')
-        d.setdefault('_props', dict())
-        d.setdefault('_locked', False)
-        if name in d['_props']:
-            f = d['_props'][name][1]
-            if f is None:
-                raise AttributeError("can't set attribute")
-            f(value)
-            return
-        if name not in d and self._locked:
+        if self._locked and name not in self.__dict__:
             raise AttributeError("locked")
         object.__setattr__(self, name, value)
         
     def __delattr__(self, name):
-        d = object.__getattribute__(self, '__dict__')
-        d.setdefault('_props', dict())
-        d.setdefault('_locked', False)
-        if name in d['_props']:
-            f = d['_props'][name][2]
-            if f is None:
-                raise AttributeError("can't delete attribute")
-            f()
-            return
-        if name not in d and self._locked:
+        if self._locked and name not in self.__dict__:
             raise AttributeError("locked")
         object.__delattr__(self, name)
         
@@ -412,7 +431,11 @@ class Doc(object):
 
 
 class TraceY(object):
-    "Y trace object"
+    """Y trace object
+
+    y_raw may be any buffer (array.array, bytes wrapped with np.frombuffer,
+    ...), it is not copied. Scaled arrays are computed on first access and
+    cached until an attribute of the trace is assigned again."""
     def __init__(self):
         self.average_count = 1
         self.y_increment = 1
@@ -421,13 +444,46 @@ class TraceY(object):
         self.y_raw = None
         self.y_hole = None
 
-    @property
-    def y(self):
-        y = np.array(self.y_raw)
-        yf = y.astype(float)
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self.__dict__['_cache'] = dict()
+
+    def __getstate__(self):
+        # don't send cached arrays through pipes and queues
+        state = self.__dict__.copy()
+        state.pop('_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__['_cache'] = dict()
+
+    def _cached(self, name, f):
+        cache = self.__dict__.setdefault('_cache', dict())
+        if name not in cache:
+            a = f()
+            a.setflags(write=False)
+            cache[name] = a
+        return cache[name]
+
+    def _scale_y(self):
+        y = np.asarray(self.y_raw)
+        yf = ((y - float(self.y_reference)) * self.y_increment) + self.y_origin
         if self.y_hole is not None:
             yf[y == self.y_hole] = float('nan')
-        return ((yf - self.y_reference) * self.y_increment) + self.y_origin
+        return yf
+
+    @property
+    def y(self):
+        return self._cached('y', self._scale_y)
+
+    def __array__(self, dtype=None, copy=None):
+        # the cached y, copied only when asked to or for another dtype
+        if copy:
+            return np.array(self.y, dtype=dtype)
+        if copy is False and dtype is not None and np.dtype(dtype) != self.y.dtype:
+            raise ValueError("Converting the trace to %s needs a copy" % np.dtype(dtype))
+        return np.asarray(self.y, dtype=dtype)
 
     def __getitem__(self, index):
         y = self.y_raw[index]
@@ -436,7 +492,7 @@ class TraceY(object):
         return ((y - self.y_reference) * self.y_increment) + self.y_origin
 
     def __iter__(self):
-        return (float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment + self.y_origin) for i, y in enumerate(self.y_raw))
+        return iter(self.y.tolist())
 
     def __len__(self):
         return len(self.y_raw)
@@ -454,13 +510,21 @@ class TraceXY(TraceY):
         self.x_reference = 0
         self.x_raw = None
 
-    @property
-    def x(self):
+    def _scale_x(self):
         if self.x_raw is None:
             return ((np.arange(len(self.y_raw)) - self.x_reference) * self.x_increment) + self.x_origin
         else:
             return ((np.array(self.x_raw).astype(float) - self.x_reference) * self.x_increment) + self.x_origin
 
+    @property
+    def x(self):
+        return self._cached('x', self._scale_x)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("The (x, y) array of a trace is always a new array")
+        return np.column_stack((self.x, self.y)).astype(dtype or float, copy=False)
+
     def __getitem__(self, index):
         y = self.y_raw[index]
         if y == self.y_hole:
@@ -471,10 +535,7 @@ class TraceXY(TraceY):
         return (((x - self.x_reference) * self.x_increment) + self.x_origin, ((y - self.y_reference) * self.y_increment) + self.y_origin)
 
     def __iter__(self):
-        if self.x_raw is None:
-            return ((((i - self.x_reference) * self.x_increment) + self.x_origin, float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment) + self.y_origin) for i, y in enumerate(self.y_raw))
-        else:
-            return ((((x - self.x_reference) * self.x_increment) + self.x_origin, float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment) + self.y_origin) for x, y in zip(self.x_raw, self.y_raw))
+        return zip(self.x.tolist(), self.y.tolist())
 
 
 class TraceYT(TraceY):
@@ -485,14 +546,22 @@ class TraceYT(TraceY):
         self.x_origin = 0
         self.x_reference = 0
 
+    def _scale_x(self):
+        return ((np.arange(len(self.y_raw)) - self.x_reference) * self.x_increment) + self.x_origin
+
     @property
     def x(self):
-        return ((np.arange(len(self.y_raw)) - self.x_reference) * self.x_increment) + self.x_origin
+        return self._cached('x', self._scale_x)
 
     @property
     def t(self):
         return self.x
 
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("The (x, y) array of a trace is always a new array")
+        return np.column_stack((self.x, self.y)).astype(dtype or float, copy=False)
+
     def __getitem__(self, index):
         y = self.y_raw[index]
         if y == self.y_hole:
@@ -500,7 +569,7 @@ class TraceYT(TraceY):
         return (((index - self.x_reference) * self.x_increment) + self.x_origin, ((y - self.y_reference) * self.y_increment) + self.y_origin)
 
     def __iter__(self):
-        return ((((i - self.x_reference) * self.x_increment) + self.x_origin, float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment) + self.y_origin) for i, y in enumerate(self.y_raw))
+        return zip(self.x.tolist(), self.y.tolist())
 
 
 def add_attribute(obj, name, attr, doc = None):
@@ -556,6 +625,23 @@ def decode_ieee_block(data):
         return data[ind:]
 
 
+def unpack_bit_planes(data, bits=None):
+    """Unpack logic analyzer data, one sample per byte or word, into bit planes
+
+    Returns an array with one row per bit, row k holding bit k of every
+    sample as 0 or 1, so one read of a pod or group gives all of its
+    channels in one pass.  bits defaults to the width of the samples."""
+    data = np.asarray(data)
+    if data.dtype.kind not in 'ub':
+        raise ValueError("logic data must be unsigned integers")
+    size = data.dtype.itemsize
+    if bits is None:
+        bits = size * 8
+    data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('<'))
+    planes = np.unpackbits(data.view(np.uint8).reshape(-1, size), axis=1, bitorder='little')
+    return np.ascontiguousarray(planes[:, :bits].T)
+
+
 def get_sig(sig):
     "Parse various signal inputs into x and y components"
     if type(sig) == tuple and len(sig) == 2:
@@ -1952,6 +2038,9 @@ class Driver(DriverOperation, DriverIdentity, DriverUtility):
         elif 'usbtmc' in globals() and resource.__class__ == usbtmc.Instrument:
             # Got a usbtmc instrument, can use it as is
             self._interface = resource
+        elif 'usbtmc' in globals() and resource.__class__ == getattr(usbtmc, 'AsyncInstrument', None):
+            # Got an asyncio usbtmc instrument, use its blocking interface
+            self._interface = resource.blocking
         elif set(['read_raw', 'write_raw']).issubset(set(resource.__class__.__dict__)):
             # has read_raw and write_raw, so should be a usable interface
             self._interface = resource
@@ -1982,16 +2071,25 @@ class Driver(DriverOperation, DriverIdentity, DriverUtility):
     
     def _get_cache_tag(self, tag=None, skip=1):
         if tag is None:
-            stack = inspect.stack()
-            start = 0 + skip
-            if len(stack) < start + 1:
+            # only the name of the calling function is needed, so look at
+            # that one frame instead of building the whole stack with
+            # inspect.stack()
+            try:
+                tag = sys._getframe(skip).f_code.co_name
+            except ValueError:
                 return ''
-            tag = stack[start][3] 
-        
+
+        try:
+            return _cache_tags[tag]
+        except KeyError:
+            pass
+
+        name = tag
         if tag[0:4] == "_get": tag = tag[4:]
         if tag[0:4] == "_set": tag = tag[4:]
         if tag[0] == "_": tag = tag[1:]
-        
+
+        _cache_tags[name] = tag
         return tag
 
     def _get_cache_valid(self, tag=None, index=-1, skip_disable=False):
@@ -2171,29 +2269,89 @@ class Driver(DriverOperation, DriverIdentity, DriverUtility):
             raise NotInitializedException()
         return self._interface.local()
     
-    def _read_ieee_block(self):
-        "Read IEEE block"
+    def _read_ieee_block_header(self):
+        "Read IEEE block header, returns the data length, -1 if it is not given or None if nothing was read"
         # IEEE block binary data is prefixed with #lnnnnnnnn
         # where l is length of n and n is the
         # length of the data
         # ex: #800002000 prefixes 2000 data bytes
 
-        ch = self._read_raw(1)
+        ch = self._read_raw(2)
 
         if len(ch) == 0:
-            return b''
+            return None
 
-        while ch != b'#':
-            ch = self._read_raw(1)
+        while ch[0:1] != b'#' or len(ch) < 2:
+            if ch[0:1] != b'#':
+                ch = ch[1:]
+            ch = bytes(ch) + bytes(self._read_raw(1))
 
-        l = int(self._read_raw(1))
+        l = int(ch[1:2])
         if l > 0:
-            num = int(self._read_raw(l))
+            return int(self._read_raw(l))
+        return -1
+
+    def _read_ieee_block(self):
+        "Read IEEE block"
+        num = self._read_ieee_block_header()
+
+        if num is None:
+            return b''
+
+        if num >= 0:
             raw_data = self._read_raw(num)
         else:
             raw_data = self._read_raw()
 
         return raw_data
+
+    def _read_ieee_block_chunks(self, chunk_size=1024*1024):
+        "Read IEEE block, yielding the data in pieces of at most chunk_size bytes"
+        num = self._read_ieee_block_header()
+
+        if num is None:
+            return
+
+        if num < 0:
+            # no length given, the block ends with the message
+            yield self._read_raw()
+            return
+
+        while num > 0:
+            data = self._read_raw(min(num, chunk_size))
+            if len(data) == 0:
+                return
+            num -= len(data)
+            yield data
+
+    def _read_ieee_block_into(self, buffer, chunk_size=1024*1024):
+        "Read IEEE block into a writable buffer (bytearray, numpy array, mmap), returns the number of bytes read"
+        view = memoryview(buffer).cast('B')
+        num = self._read_ieee_block_header()
+
+        if num is None:
+            return 0
+
+        if num < 0:
+            data = self._read_raw()
+            num = len(data)
+            if num > len(view):
+                raise OutOfRangeException("IEEE block of %d bytes does not fit into buffer" % num)
+            view[0:num] = data
+            return num
+
+        if num > len(view):
+            raise OutOfRangeException("IEEE block of %d bytes does not fit into buffer" % num)
+
+        ind = 0
+        while ind < num:
+            data = self._read_raw(min(num - ind, chunk_size))
+            if len(data) == 0:
+                break
+            view[ind:ind+len(data)] = data
+            ind += len(data)
+
+        return ind
     
     def _ask_for_ieee_block(self, data, encoding = 'utf-8'):
         "Write string then read IEEE block"
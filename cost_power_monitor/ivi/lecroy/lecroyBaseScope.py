@@ -25,7 +25,8 @@ THE SOFTWARE.
 """
 
 import time
-import struct
+
+import numpy as np
 
 from .. import ivi
 from .. import scope
@@ -155,7 +156,7 @@ class lecroyBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.commo
                        scope.GlitchTrigger, scope.WidthTrigger, scope.AcLineTrigger,
                        scope.WaveformMeasurement, scope.MinMaxWaveform,
                        scope.ContinuousAcquisition, scope.AverageAcquisition,
-                       scope.SampleMode, scope.AutoSetup,
+                       scope.SampleMode, scope.AutoSetup, scope.SegmentedAcquisition,
                        extra.common.SystemSetup, extra.common.Screenshot,
                        ivi.Driver):
     "LeCroy generic IVI oscilloscope driver"
@@ -1410,12 +1411,18 @@ class lecroyBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.commo
         index = ivi.get_index(self._channel_name, index)
 
         if self._driver_operation_simulate:
-            return list()
+            return ivi.TraceYT()
+
+        return self._fetch_waveform(index)
 
+    def _fetch_waveform(self, index, segments=False):
+        "Reads a waveform, with segments the whole sequence as one trace"
         # Send the MSB first
         # old - self._write(":waveform:byteorder msbfirst")
-        self._write("COMM_ORDER HI")
-        self._write("COMM_FORMAT DEF9,WORD,BIN")
+        if not self._get_cache_valid('waveform_format'):
+            self._write("COMM_ORDER HI")
+            self._write("COMM_FORMAT DEF9,WORD,BIN")
+            self._set_cache_valid(True, 'waveform_format')
 
         # Read wave description and split up parts into variables
         pre = self._ask("%s:INSPECT? WAVEDESC" % self._channel_name[index]).split("\r\n")
@@ -1449,29 +1456,29 @@ class lecroyBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.commo
         if format.lower() != "word":
             raise ivi.UnexpectedResponseException()
 
+        trace = ivi.TraceYT()
+        trace.x_increment = xincrement
+        trace.x_origin = xorigin
+        trace.x_reference = 0
+        trace.y_increment = yincrement
+        trace.y_origin = -yorigin
+        trace.y_reference = 0
+        trace.y_hole = 0
+
         # Read waveform data
         self._write("%s:WAVEFORM? DAT1" % self._channel_name[index])
-        raw_data = raw_data = self._read_ieee_block()
-
-        # Split out points and convert to time and voltage pairs
-        data = list()
-        for i in range(points):
-            x = (i * xincrement) + xorigin
-
-            yval = struct.unpack(">H", raw_data[i * 2:i * 2 + 2])[0]
+        raw_data = self._read_ieee_block()
 
-            if yval > 32767:
-                yval = yval - (2 ** 16)
+        # In sequence mode DAT1 holds the segments one after another
+        if segments:
+            points = int(mydict["WAVE_ARRAY_COUNT"])
 
-            if yval == 0:
-                # hole value
-                y = float('nan')
-            else:
-                y = (yincrement * yval) - yorigin
-
-            data.append((x, y))
+        # Signed 16 bit words, MSB first (COMM_ORDER HI)
+        trace.y_raw = np.frombuffer(raw_data[0:points*2], dtype='>i2')
 
-        return data
+        if segments:
+            return self._split_waveform_segments(trace, int(mydict.get("SUBARRAY_COUNT", 1)))
+        return trace
 
     def _measurement_read_waveform(self, index, maximum_time):
         return self._measurement_fetch_waveform(index)
@@ -1608,6 +1615,34 @@ class lecroyBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.commo
         self._acquisition_sample_mode = value
         self._set_cache_valid()
 
+    def _get_acquisition_segment_count(self):
+        if not self._driver_operation_simulate and not self._get_cache_valid():
+            # SEQUENCE ON,10,500E+3 or SEQUENCE OFF,10,500E+3
+            state, count = self._ask("SEQUENCE?").split(' ')[-1].split(',')[:2]
+            self._acquisition_segment_count = int(float(count)) if state.upper() == 'ON' else 1
+            self._set_cache_valid()
+        return self._acquisition_segment_count
+
+    def _set_acquisition_segment_count(self, value):
+        value = int(value)
+        if value < 1:
+            raise ivi.OutOfRangeException()
+        if not self._driver_operation_simulate:
+            if value > 1:
+                self._write("SEQUENCE ON,%d" % value)
+            else:
+                self._write("SEQUENCE OFF")
+        self._acquisition_segment_count = value
+        self._set_cache_valid()
+
+    def _measurement_fetch_waveform_segments(self, index):
+        index = ivi.get_index(self._channel_name, index)
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for i in range(self._get_acquisition_segment_count())]
+
+        return self._fetch_waveform(index, segments=True)
+
     # Not changed
     def _measurement_auto_setup(self):
         if not self._driver_operation_simulate:
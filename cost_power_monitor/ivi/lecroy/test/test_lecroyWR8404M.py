@@ -0,0 +1,132 @@
+"""
+
+Python Interchangeable Virtual Instrument Library
+
+Copyright (c) 2014-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import io
+import math
+import unittest
+
+import numpy as np
+
+from ... import ivi
+from .. import lecroyWR8404M
+
+class VirtualWR8404M(object):
+    def __init__(self):
+        self.read_buffer = io.BytesIO()
+        self.cmd_log = list()
+
+        self.wavedesc = {
+            'COMM_TYPE': 'word',
+            'PNTS_PER_SCREEN': 0,
+            'HORIZ_INTERVAL': 1e-10,
+            'HORIZ_OFFSET': -5e-8,
+            'VERTICAL_GAIN': 0.01,
+            'VERTICAL_OFFSET': 0.5,
+        }
+        self.waveform = np.zeros(0, dtype='>i2')
+
+    def set_waveform(self, y_raw):
+        self.waveform = np.array(y_raw, dtype='>i2')
+        self.wavedesc['PNTS_PER_SCREEN'] = len(self.waveform)
+
+    def write_raw(self, data):
+        cmd = data.decode().strip()
+        self.cmd_log.append(cmd)
+
+        if cmd.endswith(':INSPECT? WAVEDESC'):
+            d = '\r\n'.join('%s : %s' % (k, v) for k, v in self.wavedesc.items())
+            self.read_buffer = io.BytesIO(d.encode())
+        elif cmd.endswith(':WAVEFORM? DAT1'):
+            block = self.waveform.tobytes()
+            self.read_buffer = io.BytesIO(b'#9%09d' % len(block) + block + b'\n')
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+
+class TestLecroyWR8404M(unittest.TestCase):
+
+    def setUp(self):
+        self.vscope = VirtualWR8404M()
+        self.scope = lecroyWR8404M(self.vscope)
+
+    def test_fetch_waveform(self):
+        y_raw = [-32768, -2, -1, 0, 1, 2, 32767]
+        self.vscope.set_waveform(y_raw)
+        trace = self.scope.channels[1].measurement.fetch_waveform()
+        self.assertTrue('C2:WAVEFORM? DAT1' in self.vscope.cmd_log)
+        self.assertEqual(len(trace), len(y_raw))
+        for i, (x, y) in enumerate(trace):
+            self.assertAlmostEqual(x, i * 1e-10 - 5e-8)
+            if y_raw[i] == 0:
+                self.assertTrue(math.isnan(y))
+            else:
+                self.assertAlmostEqual(y, 0.01 * y_raw[i] - 0.5)
+        np.testing.assert_allclose(trace.t, np.arange(len(y_raw)) * 1e-10 - 5e-8)
+        np.testing.assert_allclose(trace.y, [0.01 * y - 0.5 if y else np.nan for y in y_raw])
+
+    def test_fetch_waveform_setup_cached(self):
+        self.vscope.set_waveform([1, 2, 3])
+        self.scope.channels[0].measurement.fetch_waveform()
+        self.scope.channels[1].measurement.fetch_waveform()
+        self.assertEqual(self.vscope.cmd_log.count('COMM_FORMAT DEF9,WORD,BIN'), 1)
+        self.assertEqual(self.vscope.cmd_log.count('C2:INSPECT? WAVEDESC'), 1)
+        self.scope.driver_operation.invalidate_all_attributes()
+        self.scope.channels[1].measurement.fetch_waveform()
+        self.assertEqual(self.vscope.cmd_log.count('COMM_FORMAT DEF9,WORD,BIN'), 2)
+        self.assertEqual(self.vscope.cmd_log.count('C2:INSPECT? WAVEDESC'), 2)
+
+    def test_fetch_waveform_segments(self):
+        self.scope.acquisition.segment_count = 3
+        self.assertEqual(self.vscope.cmd_log[-1], 'SEQUENCE ON,3')
+        self.vscope.set_waveform([1, 2, 3, 4, 5, 6])
+        self.vscope.wavedesc['PNTS_PER_SCREEN'] = 2
+        self.vscope.wavedesc['WAVE_ARRAY_COUNT'] = 6
+        self.vscope.wavedesc['SUBARRAY_COUNT'] = 3
+        segments = self.scope.channels[0].measurement.fetch_waveform_segments()
+        self.assertEqual(self.vscope.cmd_log.count('C1:WAVEFORM? DAT1'), 1)
+        self.assertEqual(len(segments), 3)
+        for i, segment in enumerate(segments):
+            np.testing.assert_allclose(segment.y, [0.01 * (2*i+1) - 0.5, 0.01 * (2*i+2) - 0.5])
+            np.testing.assert_allclose(segment.t, [-5e-8, 1e-10 - 5e-8])
+        self.scope.acquisition.segment_count = 1
+        self.assertEqual(self.vscope.cmd_log[-1], 'SEQUENCE OFF')
+
+    def test_fetch_waveform_wrong_format(self):
+        self.vscope.wavedesc['COMM_TYPE'] = 'byte'
+        self.assertRaises(ivi.UnexpectedResponseException, self.scope.channels[0].measurement.fetch_waveform)
+
+    def test_fetch_waveform_simulate(self):
+        scope = lecroyWR8404M(self.vscope, simulate=True)
+        scope.acquisition.segment_count = 2
+        self.assertIsInstance(scope.channels[0].measurement.fetch_waveform(), ivi.TraceYT)
+        segments = scope.channels[0].measurement.fetch_waveform_segments()
+        self.assertEqual(len(segments), 2)
+        self.assertIsInstance(segments[0], ivi.TraceYT)
+
+
+if __name__ == '__main__':
+    unittest.main()
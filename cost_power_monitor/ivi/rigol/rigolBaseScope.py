@@ -24,11 +24,12 @@ THE SOFTWARE.
 
 """
 
-import array
+import copy
 import math
-import sys
 import time
 
+import numpy as np
+
 from .. import ivi
 from .. import scope
 from .. import scpi
@@ -163,6 +164,7 @@ class rigolBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.common
         self._analog_channel_count = 4
         self._digital_channel_name = list()
         self._digital_channel_count = 16
+        self._digital_group_size = 8 # digital channels sent together, one per bit
         self._channel_count = self._analog_channel_count + self._digital_channel_count
         self._bandwidth = 1e9
         self._bandwidth_limit = {'20M': 20e6}
@@ -178,6 +180,8 @@ class rigolBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.common
         self._timebase_window_position = 0.0
         self._timebase_window_range = 5e-6
         self._timebase_window_scale = 500e-9
+        self._waveform_source = 0
+        self._waveform_mode = 'normal'
         self._display_screenshot_image_format_mapping = ScreenshotImageFormatMapping
         self._display_vectors = True
 
@@ -1076,14 +1080,69 @@ class rigolBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.common
         if self._driver_operation_simulate:
             return ivi.TraceYT()
 
+        trace, grouped = self._fetch_waveform(index)
+
+        if grouped:
+            # extract channel from group
+            trace.y_raw = (trace.y_raw >> self._digital_bit(index)) & 1
+
+        return trace
+
+    def _measurement_fetch_waveforms(self, indices):
+        indices = [ivi.get_index(self._channel_name, index) for index in indices]
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for index in indices]
+
+        # Digital channels of one group come with one transfer, which is
+        # split into all of them with one pass
+        traces = dict()
+        for index in indices:
+            if index in traces:
+                continue
+            pod = self._digital_group(index)
+            group = [i for i in indices if pod is not None and self._digital_group(i) == pod]
+            if len(set(group)) < 2:
+                traces[index] = self._measurement_fetch_waveform(index)
+                continue
+            trace, grouped = self._fetch_waveform(index)
+            if not grouped:
+                traces[index] = trace
+                continue
+            planes = ivi.unpack_bit_planes(trace.y_raw, self._digital_group_size)
+            for i in group:
+                traces[i] = copy.copy(trace)
+                traces[i].y_raw = planes[self._digital_bit(i)]
+        return [traces[index] for index in indices]
+
+    def _digital_group(self, index):
+        "Returns the group of a digital channel, None for analog channels"
+        if self._channel_name[index] not in self._digital_channel_name:
+            return None
+        return self._digital_channel_name.index(self._channel_name[index]) // self._digital_group_size
+
+    def _digital_bit(self, index):
+        "Returns the bit of a digital channel in its group"
+        return self._digital_channel_name.index(self._channel_name[index]) % self._digital_group_size
+
+    def _fetch_waveform(self, index):
+        """Reads a waveform, returns the trace and whether it holds the raw
+        data of the whole digital channel group"""
         expected_points = float(self._ask("acquire:srate?"))*(self._horizontal_divisions*float(self._ask("timebase:scale?")))
 
-        self._write(":waveform:source %s" % self._channel_name[index])
-        self._write(":waveform:format byte")
-        if expected_points == 1200:
-            self._write(":waveform:mode normal")
-        else:
-            self._write(":waveform:mode raw")
+        mode = 'normal' if expected_points == 1200 else 'raw'
+
+        if not self._get_cache_valid('waveform_source') or self._waveform_source != index:
+            self._write(":waveform:source %s" % self._channel_name[index])
+            self._waveform_source = index
+            self._set_cache_valid(True, 'waveform_source')
+        if not self._get_cache_valid('waveform_format'):
+            self._write(":waveform:format byte")
+            self._set_cache_valid(True, 'waveform_format')
+        if not self._get_cache_valid('waveform_mode') or self._waveform_mode != mode:
+            self._write(":waveform:mode %s" % mode)
+            self._waveform_mode = mode
+            self._set_cache_valid(True, 'waveform_mode')
 
         trace = ivi.TraceYT()
 
@@ -1101,45 +1160,41 @@ class rigolBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.common
         trace.y_origin = 0.0
         trace.y_reference = int(float(pre[9]) + float(pre[8]))
 
+        # Read waveform data
+        trace.y_raw = self._read_waveform_blocks(acq_format, points)
+
+        # handle digital channels, a raw waveform holds the group
+        if self._channel_name[index] in self._digital_channel_name:
+            trace.y_increment = 1
+            return trace, points != 1200
+
+        return trace, False
+
+    def _read_waveform_blocks(self, acq_format, points):
+        """Reads the waveform data in blocks of at most 250000 bytes, as the
+        scope sends deep memory, into a buffer sized from the preamble"""
         if acq_format == 0:
             block_size = 250000
+            data = np.empty(points, dtype='B')
         elif acq_format == 1:
             block_size = 125000
+            data = np.empty(points, dtype='<u2')
         else:
-            raise UnexpectedResponseException()
+            raise ivi.UnexpectedResponseException()
 
-        # Read waveform data
-        data = bytearray()
+        view = memoryview(data).cast('B')
+        ind = 0
 
+        # one write and one read per block
         for offset in range(1, points+1, block_size):
-            self._write(":waveform:start %d" % offset)
-            self._write(":waveform:stop %d" % min(points, offset+block_size-1))
-            self._write(":waveform:data?")
-            raw_data = self._read_raw()
-            data.extend(ivi.decode_ieee_block(raw_data))
-
-        # Store in trace object
-        if acq_format == 0:
-            trace.y_raw = array.array('B', data[0:points])
-        elif acq_format == 1:
-            trace.y_raw = array.array('H', data[0:points*2])
-
-            if sys.byteorder == 'big':
-                trace.y_raw.byteswap()
-
-        # handle digital channels
-        if self._channel_name[index] in self._digital_channel_name:
-            trace.y_increment = 1
-
-            if points != 1200:
-                # raw waveform; extract channel from group
-                digital_index = self._digital_channel_name.index(self._channel_name[index])
-                offset = digital_index % 8
-
-                for k in range(points):
-                    trace.y_raw[k] = (trace.y_raw[k] >> offset) & 1
-
-        return trace
+            self._write(":waveform:start %d;:waveform:stop %d;:waveform:data?"
+                        % (offset, min(points, offset+block_size-1)))
+            block = ivi.decode_ieee_block(self._read_raw())
+            block = block[:len(view)-ind]
+            view[ind:ind+len(block)] = block
+            ind += len(block)
+
+        return data[:ind // data.itemsize]
 
     def _measurement_read_waveform(self, index, maximum_time):
         return self._measurement_fetch_waveform(index)
@@ -39,6 +39,7 @@ class rigolDS2000A(rigolBaseScope, rigolDSSource):
 
         self._analog_channel_count = 2
         self._digital_channel_count = 16
+        self._digital_group_size = 16 # la source, all channels in one word
         self._bandwidth = 300e6
         self._bandwidth_limit = {'20M': 20e6, '100M': 100e6}
         self._max_averages = 8192
@@ -90,12 +91,7 @@ class rigolDS2000A(rigolBaseScope, rigolDSSource):
         self._set_cache_valid(False, 'channel_range', index)
         self._set_cache_valid(False, 'trigger_level')
 
-    def _measurement_fetch_waveform(self, index):
-        index = ivi.get_index(self._channel_name, index)
-
-        if self._driver_operation_simulate:
-            return ivi.TraceYT()
-
+    def _fetch_waveform(self, index):
         if self._channel_name[index] in self._digital_channel_name:
             self._write(":waveform:source la")
             self._write(":waveform:format word")
@@ -120,41 +116,13 @@ class rigolDS2000A(rigolBaseScope, rigolDSSource):
         trace.y_origin = 0.0
         trace.y_reference = int(float(pre[9]) + float(pre[8]))
 
-        if acq_format == 0:
-            block_size = 250000
-        elif acq_format == 1:
-            block_size = 125000
-        else:
-            raise UnexpectedResponseException()
-
         # Read waveform data
-        data = bytearray()
+        trace.y_raw = self._read_waveform_blocks(acq_format, points)
 
-        for offset in range(1, points+1, block_size):
-            self._write(":waveform:start %d" % offset)
-            self._write(":waveform:stop %d" % min(points, offset+block_size-1))
-            self._write(":waveform:data?")
-            raw_data = self._read_raw()
-            data.extend(ivi.decode_ieee_block(raw_data))
-
-        # Store in trace object
-        if acq_format == 0:
-            trace.y_raw = array.array('B', data[0:points])
-        elif acq_format == 1:
-            trace.y_raw = array.array('H', data[0:points*2])
-
-            if sys.byteorder == 'big':
-                trace.y_raw.byteswap()
-
-        # handle digital channels
+        # handle digital channels, la holds all of them
         if self._channel_name[index] in self._digital_channel_name:
             trace.y_increment = 1
+            return trace, True
 
-            # extract channel from group
-            digital_index = self._digital_channel_name.index(self._channel_name[index])
-            
-            for k in range(points):
-                trace.y_raw[k] = (trace.y_raw[k] >> offset) & 1
-
-        return trace
+        return trace, False
 
@@ -0,0 +1,132 @@
+"""
+
+Python Interchangeable Virtual Instrument Library
+
+Copyright (c) 2014-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+
+import io
+import unittest
+
+import numpy as np
+
+from ... import ivi
+from .. import rigolMSO1104Z
+
+class VirtualMSO1104Z(object):
+    def __init__(self):
+        self.read_buffer = io.BytesIO()
+        self.cmd_log = list()
+
+        self.srate = 1e6
+        self.scale = 1e-3
+        self.data_format = 'byte'
+        self.waveform = np.zeros(0)
+        self.start = 1
+        self.stop = 1
+
+    def set_waveform(self, y_raw):
+        self.waveform = np.array(y_raw)
+
+    def preamble(self):
+        acq_format = 0 if self.data_format == 'byte' else 1
+        return '%d,0,%d,1,1e-9,-6e-6,0,0.01,0,127' % (acq_format, len(self.waveform))
+
+    def write_raw(self, data):
+        response = None
+
+        for cmd in data.decode().strip().split(';'):
+            cmd = cmd.lstrip(':')
+            self.cmd_log.append(cmd)
+
+            if cmd == 'acquire:srate?':
+                response = str(self.srate)
+            elif cmd == 'timebase:scale?':
+                response = str(self.scale)
+            elif cmd.startswith('waveform:format '):
+                self.data_format = cmd.split(' ')[1]
+            elif cmd == 'waveform:preamble?':
+                response = self.preamble()
+            elif cmd.startswith('waveform:start '):
+                self.start = int(cmd.split(' ')[1])
+            elif cmd.startswith('waveform:stop '):
+                self.stop = int(cmd.split(' ')[1])
+            elif cmd == 'waveform:data?':
+                dtype = 'B' if self.data_format == 'byte' else '<u2'
+                block = np.array(self.waveform[self.start-1:self.stop], dtype=dtype).tobytes()
+                response = b'#9%09d' % len(block) + block
+
+        if response is not None:
+            if isinstance(response, str):
+                response = response.encode()
+            self.read_buffer = io.BytesIO(response + b'\n')
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+
+class TestRigolMSO1104Z(unittest.TestCase):
+
+    def setUp(self):
+        self.vscope = VirtualMSO1104Z()
+        self.scope = rigolMSO1104Z(self.vscope)
+
+    def test_fetch_waveform(self):
+        y_raw = np.arange(600000) % 256
+        self.vscope.set_waveform(y_raw)
+        trace = self.scope.channels[0].measurement.fetch_waveform()
+        data_queries = [cmd for cmd in self.vscope.cmd_log if cmd == 'waveform:data?']
+        self.assertEqual(len(data_queries), 3)
+        self.assertTrue('waveform:stop 600000' in self.vscope.cmd_log)
+        np.testing.assert_array_equal(trace.y_raw, y_raw)
+        np.testing.assert_allclose(trace.y[:3], (y_raw[:3] - 127) * 0.01)
+
+    def test_fetch_waveform_digital(self):
+        y_raw = [0x00, 0x04, 0xff, 0x0b]
+        self.vscope.set_waveform(y_raw)
+        trace = self.scope.channels['d10'].measurement.fetch_waveform()
+        np.testing.assert_array_equal(trace.y_raw, [0, 1, 1, 0])
+        self.assertEqual(trace.y_increment, 1)
+
+    def test_fetch_waveforms_digital_group(self):
+        y_raw = [0x00, 0x05, 0xff, 0x82]
+        self.vscope.set_waveform(y_raw)
+        traces = self.scope.measurement.fetch_waveforms(['d0', 'd2', 'd7', 'd1'])
+        self.assertEqual(self.vscope.cmd_log.count('waveform:data?'), 1)
+        np.testing.assert_array_equal(traces[0].y_raw, [0, 1, 1, 0])
+        np.testing.assert_array_equal(traces[1].y_raw, [0, 1, 1, 0])
+        np.testing.assert_array_equal(traces[2].y_raw, [0, 0, 1, 1])
+        np.testing.assert_array_equal(traces[3].y_raw, [0, 0, 1, 1])
+        self.assertEqual(traces[2].x_increment, 1e-9)
+
+    def test_fetch_waveforms_mixed(self):
+        self.vscope.set_waveform([0x01, 0x10])
+        traces = self.scope.measurement.fetch_waveforms(['channel1', 'd4', 'd12'])
+        self.assertEqual(self.vscope.cmd_log.count('waveform:data?'), 3)
+        np.testing.assert_array_equal(traces[0].y_raw, [0x01, 0x10])
+        np.testing.assert_array_equal(traces[1].y_raw, [0, 1])
+        np.testing.assert_array_equal(traces[2].y_raw, [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
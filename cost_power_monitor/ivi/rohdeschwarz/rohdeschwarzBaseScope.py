@@ -24,6 +24,8 @@ THE SOFTWARE.
 
 """
 
+import numpy as np
+
 from .. import ivi
 from .. import scope
 from .. import scpi
@@ -112,6 +114,13 @@ MeasurementStatusMapping = {
 ScreenshotImageFormatMapping = {
         'bmp': 'bmp',
         'png': 'png'}
+WaveformTransferFormatMapping = {
+        'ascii': 'ascii',
+        'int16': 'int,16',
+        'real32': 'real,32'}
+# The vertical divisions of the screen span 253 levels of the 8 bit ADC,
+# INT,16 data has 8 more bits of resolution
+WaveformInt16Levels = 253 * 256
 TimebaseModeMapping = {
         'main': 'main',
         'window': 'wind',
@@ -124,7 +133,7 @@ TimebaseReferenceMapping = {
 
 class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi.common.Reset,
                             scope.Base, scope.ContinuousAcquisition, scope.TriggerModifier, scope.Interpolation,
-                            scope.WaveformMeasurement,
+                            scope.WaveformMeasurement, scope.SegmentedAcquisition,
                             extra.common.Screenshot,
                             ivi.Driver):
     "Rohde&Schwarz generic IVI oscilloscope driver"
@@ -170,6 +179,11 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
         self._trigger_continuous = True
 
         self._display_screenshot_image_format_mapping = ScreenshotImageFormatMapping
+
+        self._waveform_transfer_format = 'real32'
+        self._waveform_format = None
+        self._waveform_export = ()
+        self._waveform_scaling = dict()
         self._display_vectors = True
 
         self._identity_description = "Rohde&Schwarz generic IVI oscilloscope driver"
@@ -259,6 +273,23 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
                         Enables or disables the automatic record length. The instrument sets a value that fits to the selected timebase.
                         """))
 
+        self._add_property('waveform.transfer_format',
+                        self._get_waveform_transfer_format,
+                        self._set_waveform_transfer_format,
+                        None,
+                        ivi.Doc("""
+                        Selects the data format of waveform transfers. int16 transfers the ADC
+                        levels of analog channels, other channels are transferred as real32. The
+                        levels are scaled with the vertical settings of the channel, which are read
+                        once and cached. Call driver_operation.invalidate_all_attributes after
+                        changing them on the front panel.
+                        
+                        Values:
+                        * 'ascii'
+                        * 'int16'
+                        * 'real32'
+                        """))
+
         self._add_property('channels[].invert',
                         self._get_channel_invert,
                         self._set_channel_invert,
@@ -734,6 +765,7 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
             self._write("%s:offset %e" % (self._channel_name[index], value))
         self._channel_offset[index] = value
         self._set_cache_valid(index=index)
+        self._set_cache_valid(False, "waveform_scaling", index)
 
     def _get_channel_range(self, index):
         index = ivi.get_index(self._analog_channel_name, index)
@@ -757,6 +789,7 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
         self._set_cache_valid(index=index)
         self._set_cache_valid(True, "channel_scale", index)
         self._set_cache_valid(False, "channel_offset", index)
+        self._set_cache_valid(False, "waveform_scaling", index)
 
     def _get_channel_scale(self, index):
         index = ivi.get_index(self._analog_channel_name, index)
@@ -780,6 +813,7 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
         self._set_cache_valid(index=index)
         self._set_cache_valid(True, "channel_range", index)
         self._set_cache_valid(False, "channel_offset", index)
+        self._set_cache_valid(False, "waveform_scaling", index)
 
 
     # Trigger functions
@@ -960,22 +994,170 @@ class rohdeschwarzBaseScope(scpi.common.IdnCommand, scpi.common.ErrorQuery, scpi
         index = ivi.get_index(self._channel_name, index)
 
         if self._driver_operation_simulate:
-            return list()
+            return ivi.TraceYT()
+
+        transfer_format = self._setup_waveform_transfer([index])
+        x0, dx, N = self._fetch_waveform_header(index)
+        y = self._fetch_waveform_data(index, transfer_format)
+        return self._waveform_trace(index, transfer_format, x0, dx, y[:N])
 
+    def _measurement_fetch_waveforms(self, indices):
+        indices = [ivi.get_index(self._channel_name, index) for index in indices]
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for index in indices]
+
+        # multichannel export covers analog channels, each one once
+        if (len(indices) < 2 or len(set(indices)) != len(indices)
+                or max(indices) >= self._analog_channel_count):
+            return super(rohdeschwarzBaseScope, self)._measurement_fetch_waveforms(indices)
+
+        # The data query of one channel returns the samples of all exported
+        # channels of the same acquisition, interleaved in channel order
+        exported = sorted(indices)
+        transfer_format = self._setup_waveform_transfer(exported)
+        x0, dx, N = self._fetch_waveform_header(exported[0])
+        y = self._fetch_waveform_data(exported[0], transfer_format)
+        y = y[:N*len(exported)].reshape(-1, len(exported))
+        return [self._waveform_trace(index, transfer_format, x0, dx, y[:,exported.index(index)])
+                for index in indices]
+
+    def _get_waveform_transfer_format(self):
+        return self._waveform_transfer_format
+
+    def _set_waveform_transfer_format(self, value):
+        if value not in WaveformTransferFormatMapping:
+            raise ivi.ValueNotSupportedException()
+        self._waveform_transfer_format = value
+
+    def _setup_waveform_transfer(self, indices):
+        """Selects the transfer format and the exported channels, returns
+        the transfer format to use"""
+        transfer_format = self._waveform_transfer_format
+        if transfer_format == 'int16' and max(indices) >= self._analog_channel_count:
+            transfer_format = 'real32'
+
+        if not self._get_cache_valid('waveform_format') or self._waveform_format != transfer_format:
+            self._write("format:data %s" % WaveformTransferFormatMapping[transfer_format])
+            if transfer_format != 'ascii':
+                self._write("format:border lsbfirst")
+            self._waveform_format = transfer_format
+            self._set_cache_valid(True, 'waveform_format')
+            # read the vertical settings again with the new setup
+            for i in range(self._analog_channel_count):
+                self._set_cache_valid(False, 'waveform_scaling', i)
+
+        # channels exported together
+        export = tuple(sorted(indices)) if len(indices) > 1 else ()
+        if not self._get_cache_valid('waveform_export') or self._waveform_export != export:
+            if export:
+                for i in range(self._analog_channel_count):
+                    self._write("%s:exportstate %s" % (self._channel_name[i], 'on' if i in export else 'off'))
+                self._write("export:waveform:multichannel on")
+            else:
+                self._write("export:waveform:multichannel off")
+            self._waveform_export = export
+            self._set_cache_valid(True, 'waveform_export')
+
+        return transfer_format
+
+    def _fetch_waveform_header(self, index):
+        "Returns start time, sample interval and record length"
         data_header = self._ask("%s:data:header?" % self._channel_name[index]).split(',') # x0, xN, record length, values/sample interval
         x0 = float(data_header[0])
         xN = float(data_header[1])
         N = int(data_header[2])
-        dx = (xN - x0) / N
-        x = [(x0 + i * dx) for i in range(0, N)]
-        y = self._ask("%s:data?" % self._channel_name[index]).split(',')
-        y = [float(yi) for yi in y]
-        return list(zip(x, y))
+        return x0, (xN - x0) / N, N
+
+    def _fetch_waveform_data(self, index, transfer_format):
+        if transfer_format == 'ascii':
+            return np.array(self._ask("%s:data?" % self._channel_name[index]).split(','), dtype=float)
+
+        raw_data = self._ask_for_ieee_block("%s:data?" % self._channel_name[index])
+        self._read_raw() # flush buffer
+        if transfer_format == 'int16':
+            return np.frombuffer(raw_data, dtype='<i2')
+        return np.frombuffer(raw_data, dtype='<f4')
+
+    def _waveform_trace(self, index, transfer_format, x0, dx, y):
+        trace = ivi.TraceYT()
+        trace.x_increment = dx
+        trace.x_origin = x0
+        trace.x_reference = 0
+
+        if transfer_format == 'int16':
+            # ADC levels, scaled like the screen
+            trace.y_increment, trace.y_origin = self._get_waveform_scaling(index)
+        else:
+            trace.y_increment = 1
+            trace.y_origin = 0
+        trace.y_reference = 0
+
+        trace.y_raw = y
+        return trace
+
+    def _get_waveform_scaling(self, index):
+        "Returns the y increment and origin of int16 data of an analog channel"
+        if not self._get_cache_valid(index=index):
+            scale = float(self._ask("%s:scale?" % self._channel_name[index]))
+            position = float(self._ask("%s:position?" % self._channel_name[index]))
+            offset = float(self._ask("%s:offset?" % self._channel_name[index]))
+            self._waveform_scaling[index] = (scale * self._vertical_divisions / WaveformInt16Levels,
+                                             offset - position * scale)
+            self._set_cache_valid(index=index)
+        return self._waveform_scaling[index]
 
     def _measurement_read_waveform(self, index, maximum_time=None):
         # Add functionaly according to Python-IVI scope specification
         return self._measurement_fetch_waveform(index)
 
+    # scope.SegmentedAcquisition
+    def _get_acquisition_segment_count(self):
+        if not self._driver_operation_simulate and not self._get_cache_valid():
+            if int(self._ask("acquire:segmented:state?")):
+                self._acquisition_segment_count = int(self._ask("acquire:count?"))
+            else:
+                self._acquisition_segment_count = 1
+            self._set_cache_valid()
+        return self._acquisition_segment_count
+
+    def _set_acquisition_segment_count(self, value):
+        value = int(value)
+        if value < 1:
+            raise ivi.OutOfRangeException()
+        if not self._driver_operation_simulate:
+            if value > 1:
+                self._write("acquire:segmented:state on")
+                self._write("acquire:count %d" % value)
+            else:
+                self._write("acquire:segmented:state off")
+        self._acquisition_segment_count = value
+        self._set_cache_valid()
+
+    def _measurement_fetch_waveform_segments(self, index):
+        index = ivi.get_index(self._channel_name, index)
+        count = self._get_acquisition_segment_count()
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for i in range(count)]
+
+        if count == 1:
+            return [self._measurement_fetch_waveform(index)]
+
+        # With data logging, one data query returns the history
+        # acquisitions from start to stop, oldest first
+        transfer_format = self._setup_waveform_transfer([index])
+        self._write("%s:history:start %d" % (self._channel_name[index], 1 - count))
+        self._write("%s:history:stop 0" % self._channel_name[index])
+        self._write("export:waveform:dlogging on")
+        try:
+            x0, dx, N = self._fetch_waveform_header(index)
+            y = self._fetch_waveform_data(index, transfer_format)
+        finally:
+            self._write("export:waveform:dlogging off")
+        trace = self._waveform_trace(index, transfer_format, x0, dx, y[:N*count])
+        return self._split_waveform_segments(trace, count)
+
     # extra.common
     def _display_fetch_screenshot(self, format='png', invert=False):
         if self._driver_operation_simulate:
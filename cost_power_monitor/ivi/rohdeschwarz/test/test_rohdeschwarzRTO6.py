@@ -0,0 +1,246 @@
+"""
+
+Python Interchangeable Virtual Instrument Library
+
+Copyright (c) 2014-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import io
+import unittest
+
+import numpy as np
+
+from ... import ivi
+from .. import rohdeschwarzRTO6
+
+class VirtualRTO6(object):
+    def __init__(self):
+        self.read_buffer = io.BytesIO()
+        self.cmd_log = list()
+
+        self.data_format = 'ascii'
+        self.header = (-5e-8, 5e-8, 0, 1)
+        self.scale = 0.1
+        self.position = 1.0
+        self.offset = 0.2
+        self.waveform = np.zeros(0)
+        self.channel_waveforms = dict()
+        self.multichannel = False
+        self.exported = set()
+        self.dlogging = False
+        self.history = list()
+        self.block = None
+
+    def set_waveform(self, y, channel=None):
+        if channel is None:
+            self.waveform = np.array(y, dtype=float)
+        else:
+            self.channel_waveforms[channel] = np.array(y, dtype=float)
+        self.header = (self.header[0], self.header[1], len(y), 1)
+
+    def get_waveform(self, channel):
+        if self.dlogging:
+            # history acquisitions, one after another
+            return np.concatenate(self.history)
+        if self.multichannel:
+            # samples of all exported channels, interleaved
+            return np.column_stack([self.get_single_waveform(c)
+                                    for c in sorted(self.exported)]).ravel()
+        return self.get_single_waveform(channel)
+
+    def get_single_waveform(self, channel):
+        return self.channel_waveforms.get(channel, self.waveform)
+
+    def write_raw(self, data):
+        cmd = data.decode().strip()
+        self.cmd_log.append(cmd)
+        response = None
+
+        if cmd.startswith('format:data '):
+            self.data_format = cmd.split(' ')[1]
+        elif cmd.startswith('export:waveform:dlogging '):
+            self.dlogging = cmd.endswith(' on')
+        elif cmd.startswith('export:waveform:multichannel '):
+            self.multichannel = cmd.endswith(' on')
+        elif ':exportstate ' in cmd:
+            channel = cmd.split(':')[0]
+            if cmd.endswith(' on'):
+                self.exported.add(channel)
+            else:
+                self.exported.discard(channel)
+        elif cmd.endswith(':data:header?'):
+            response = ','.join(str(v) for v in self.header).encode()
+        elif cmd.endswith(':data?') and self.block is not None:
+            response = self.block
+        elif cmd.endswith(':data?'):
+            waveform = self.get_waveform(cmd.split(':')[0])
+            if self.data_format == 'ascii':
+                response = ','.join(str(v) for v in waveform).encode()
+            else:
+                if self.data_format == 'int,16':
+                    block = np.array(waveform, dtype='<i2').tobytes()
+                else:
+                    block = np.array(waveform, dtype='<f4').tobytes()
+                response = b'#9%09d' % len(block) + block
+        elif cmd.endswith(':scale?'):
+            response = repr(self.scale).encode()
+        elif cmd.endswith(':position?'):
+            response = repr(self.position).encode()
+        elif cmd.endswith(':offset?'):
+            response = repr(self.offset).encode()
+
+        if response is not None:
+            self.read_buffer = io.BytesIO(response + b'\n')
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+
+class TestRohdeschwarzRTO6(unittest.TestCase):
+
+    def setUp(self):
+        self.vscope = VirtualRTO6()
+        self.scope = rohdeschwarzRTO6(self.vscope)
+
+    def fetch(self, transfer_format, y):
+        self.scope.waveform.transfer_format = transfer_format
+        self.vscope.set_waveform(y)
+        return self.scope.channels[1].measurement.fetch_waveform()
+
+    def test_fetch_waveform_real32(self):
+        y = [-0.5, 0.25, 0, 1.5]
+        trace = self.fetch('real32', y)
+        self.assertTrue('format:data real,32' in self.vscope.cmd_log)
+        self.assertTrue('channel2:data?' in self.vscope.cmd_log)
+        np.testing.assert_allclose(trace.t, -5e-8 + np.arange(4) * 2.5e-8)
+        np.testing.assert_allclose(trace.y, y)
+
+    def test_fetch_waveform_ascii(self):
+        y = [-0.5, 0.25, 0.125, 1.5]
+        trace = self.fetch('ascii', y)
+        self.assertTrue('format:data ascii' in self.vscope.cmd_log)
+        np.testing.assert_allclose(trace.y, y)
+        self.assertEqual(len(trace), 4)
+
+    def test_fetch_waveform_int16(self):
+        y = [-32768, -1, 0, 1, 32767]
+        trace = self.fetch('int16', y)
+        self.assertTrue('format:data int,16' in self.vscope.cmd_log)
+        levels = 253 * 256 / 10
+        np.testing.assert_allclose(trace.y, np.array(y) * 0.1 / levels - 1.0 * 0.1 + 0.2)
+
+    def test_fetch_waveform_format_cached(self):
+        self.fetch('real32', [1, 2])
+        self.fetch('real32', [1, 2])
+        self.assertEqual(self.vscope.cmd_log.count('format:data real,32'), 1)
+        self.fetch('ascii', [1, 2])
+        self.assertEqual(self.vscope.cmd_log.count('format:data ascii'), 1)
+        self.scope.driver_operation.invalidate_all_attributes()
+        self.fetch('ascii', [1, 2])
+        self.assertEqual(self.vscope.cmd_log.count('format:data ascii'), 2)
+
+    def test_fetch_waveforms(self):
+        for transfer_format in ['real32', 'ascii', 'int16']:
+            self.scope.waveform.transfer_format = transfer_format
+            self.vscope.set_waveform([1, 2, 3], 'channel1')
+            self.vscope.set_waveform([4, 5, 6], 'channel2')
+            self.vscope.set_waveform([7, 8, 9], 'channel3')
+            traces = self.scope.measurement.fetch_waveforms([2, 'channel1'])
+            queries = [cmd for cmd in self.vscope.cmd_log if cmd.endswith(':data?')]
+            self.assertEqual(queries, ['channel1:data?'])
+            self.assertEqual(self.vscope.exported, set(['channel1', 'channel3']))
+            np.testing.assert_allclose(traces[0].y_raw, [7, 8, 9])
+            np.testing.assert_allclose(traces[1].y_raw, [1, 2, 3])
+            self.vscope.cmd_log = []
+
+    def test_fetch_waveforms_then_single(self):
+        self.vscope.set_waveform([1, 2], 'channel1')
+        self.vscope.set_waveform([3, 4], 'channel2')
+        self.scope.measurement.fetch_waveforms([0, 1])
+        self.scope.measurement.fetch_waveforms([0, 1])
+        self.assertEqual(self.vscope.cmd_log.count('export:waveform:multichannel on'), 1)
+        trace = self.scope.channels[1].measurement.fetch_waveform()
+        self.assertFalse(self.vscope.multichannel)
+        np.testing.assert_allclose(trace.y, [3, 4])
+
+    def test_fetch_waveforms_fallback(self):
+        self.vscope.set_waveform([1, 2])
+        traces = self.scope.measurement.fetch_waveforms([0, 0])
+        self.assertEqual(len(traces), 2)
+        self.assertFalse('export:waveform:multichannel on' in self.vscope.cmd_log)
+
+    def test_fetch_waveform_segments(self):
+        self.scope.acquisition.segment_count = 3
+        self.assertEqual(self.vscope.cmd_log[-2:], ['acquire:segmented:state on', 'acquire:count 3'])
+        self.vscope.set_waveform([0, 0])
+        self.vscope.history = [np.array([1., 2.]), np.array([3., 4.]), np.array([5., 6.])]
+        segments = self.scope.channels[0].measurement.fetch_waveform_segments()
+        self.assertEqual(len(segments), 3)
+        for i, segment in enumerate(segments):
+            np.testing.assert_allclose(segment.y, [2*i+1, 2*i+2])
+            np.testing.assert_allclose(segment.t, [-5e-8, 0])
+        self.assertTrue('channel1:history:start -2' in self.vscope.cmd_log)
+        self.assertEqual(self.vscope.cmd_log.count('channel1:data?'), 1)
+        self.assertFalse(self.vscope.dlogging)
+
+    def test_fetch_waveform_segments_off(self):
+        self.scope.acquisition.segment_count = 1
+        self.assertEqual(self.vscope.cmd_log[-1], 'acquire:segmented:state off')
+        self.vscope.set_waveform([1, 2])
+        segments = self.scope.channels[0].measurement.fetch_waveform_segments()
+        self.assertEqual(len(segments), 1)
+        np.testing.assert_allclose(segments[0].y, [1, 2])
+        self.assertRaises(ivi.OutOfRangeException, setattr, self.scope.acquisition, 'segment_count', 0)
+
+    def test_fetch_waveform_int16_scaling_cached(self):
+        self.fetch('int16', [1, 2])
+        self.fetch('int16', [1, 2])
+        self.assertEqual(self.vscope.cmd_log.count('channel2:scale?'), 1)
+        self.assertEqual(self.vscope.cmd_log.count('channel2:position?'), 1)
+        # setting the scale reads the scaling again
+        self.scope.channels[1].scale = 0.2
+        self.vscope.scale = 0.2
+        trace = self.fetch('int16', [256])
+        self.assertEqual(self.vscope.cmd_log.count('channel2:scale?'), 2)
+        np.testing.assert_allclose(trace.y, 256 * 0.2 * 10 / (253 * 256) - 1.0 * 0.2 + 0.2)
+
+    def test_fetch_waveform_int16_block(self):
+        # canned header and block, 3 samples
+        self.vscope.header = (-1e-6, 2e-6, 3, 1)
+        self.vscope.block = b'#16' + b'\x00\x00\x00\x01\xff\xff'
+        self.scope.waveform.transfer_format = 'int16'
+        trace = self.scope.channels[0].measurement.fetch_waveform()
+        np.testing.assert_allclose(trace.t, [-1e-6, 0, 1e-6])
+        np.testing.assert_allclose(trace.y_raw, [0, 256, -1])
+        # a view of the received block, not a copy
+        self.assertFalse(trace.y_raw.flags.owndata)
+        levels = 253 * 256 / 10
+        np.testing.assert_allclose(trace.y, np.array([0, 256, -1]) * 0.1 / levels - 1.0 * 0.1 + 0.2)
+
+    def test_fetch_waveform_bad_format(self):
+        with self.assertRaises(ivi.ValueNotSupportedException):
+            self.scope.waveform.transfer_format = 'int8'
+        self.assertEqual(self.scope.waveform.transfer_format, 'real32')
+
+
+if __name__ == '__main__':
+    unittest.main()
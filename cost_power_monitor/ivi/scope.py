@@ -24,6 +24,10 @@ THE SOFTWARE.
 
 """
 
+import copy
+
+import numpy as np
+
 from . import ivi
 
 # Exceptions
@@ -405,6 +409,18 @@ class Base(ivi.IviContainer):
                         interaction with the instrument. Call the Error Query function at the
                         conclusion of the sequence to check the instrument status.
                         """, cls, grp, '4.3.14'))
+        self._add_method('measurement.fetch_waveforms',
+                        self._measurement_fetch_waveforms,
+                        ivi.Doc("""
+                        This function returns the waveforms of several channels, given as a
+                        list of channel indices or names, in the same order. It is not part of
+                        the IVI specification.
+                        
+                        Drivers for oscilloscopes that can transfer several channels with one
+                        query use that, so the waveforms come from the same acquisition.
+                        Otherwise the waveforms are fetched one after another like with the
+                        Fetch Waveform function.
+                        """))
         self._add_property('trigger.coupling',
                         self._get_trigger_coupling,
                         self._set_trigger_coupling,
@@ -754,6 +770,9 @@ class Base(ivi.IviContainer):
     def _measurement_read_waveform(self, index, maximum_time):
         return self._measurement_fetch_waveform(index)
     
+    def _measurement_fetch_waveforms(self, indices):
+        return [self._measurement_fetch_waveform(index) for index in indices]
+    
     def _measurement_initiate(self):
         pass
 
@@ -1669,6 +1688,63 @@ class AverageAcquisition(ivi.IviContainer):
         self._acquisition_number_of_averages = value
 
 
+class SegmentedAcquisition(ivi.IviContainer):
+    "Extension methods for oscilloscopes supporting segmented acquisition, not part of the IVI specification"
+    
+    def __init__(self, *args, **kwargs):
+        super(SegmentedAcquisition, self).__init__( *args, **kwargs)
+        
+        cls = 'IviScope'
+        grp = 'SegmentedAcquisition'
+        ivi.add_group_capability(self, cls+grp)
+        
+        self._acquisition_segment_count = 1
+        
+        self._add_property('acquisition.segment_count',
+                        self._get_acquisition_segment_count,
+                        self._set_acquisition_segment_count,
+                        None,
+                        ivi.Doc("""
+                        Specifies the number of triggers the oscilloscope captures into segments
+                        of its acquisition memory for one acquisition. A value of 1 turns
+                        segmented acquisition off. Instruments call this segmented memory,
+                        sequence mode, fast segmentation or FastFrame.
+                        """))
+        self._add_method('channels[].measurement.fetch_waveform_segments',
+                        self._measurement_fetch_waveform_segments,
+                        ivi.Doc("""
+                        This function returns the waveforms of all segments of the last
+                        acquisition for the specified channel, as a list with one trace per
+                        segment, oldest first. The segments of one acquisition share the
+                        scaling of the channel. Where the instrument allows, all segments are
+                        transferred with one query.
+                        """))
+    
+    def _get_acquisition_segment_count(self):
+        return self._acquisition_segment_count
+    
+    def _set_acquisition_segment_count(self, value):
+        value = int(value)
+        if value < 1:
+            raise ivi.OutOfRangeException()
+        self._acquisition_segment_count = value
+    
+    def _measurement_fetch_waveform_segments(self, index):
+        index = ivi.get_index(self._channel_name, index)
+        return [self._measurement_fetch_waveform(index)]
+    
+    def _split_waveform_segments(self, trace, count):
+        "Splits a trace of count segments of the same length into count traces"
+        y = np.asarray(trace.y_raw)
+        length = len(y) // count
+        segments = list()
+        for i in range(count):
+            segment = copy.copy(trace)
+            segment.y_raw = y[i*length:(i+1)*length]
+            segments.append(segment)
+        return segments
+
+
 class SampleMode(ivi.IviContainer):
     "Extension IVI methods for oscilloscopes supporting equivalent and real time acquisition"
     
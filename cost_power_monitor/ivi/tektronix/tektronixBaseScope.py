@@ -211,6 +211,7 @@ class tektronixBaseScope(scpi.common.IdnCommand, scpi.common.Reset, scpi.common.
         self._timebase_window_position = 0.0
         self._timebase_window_range = 5e-6
         self._timebase_window_scale = 500e-9
+        self._waveform_source = 0
         self._display_screenshot_image_format_mapping = ScreenshotImageFormatMapping
         self._display_vectors = True
         self._display_labels = True
@@ -1267,11 +1268,16 @@ class tektronixBaseScope(scpi.common.IdnCommand, scpi.common.Reset, scpi.common.
         if self._driver_operation_simulate:
             return ivi.TraceYT()
 
-        self._write(":data:source %s" % self._channel_name[index])
-        self._write(":data:encdg fastest")
-        self._write(":data:width 2")
-        self._write(":data:start 1")
-        self._write(":data:stop 1e10")
+        if not self._get_cache_valid('waveform_source') or self._waveform_source != index:
+            self._write(":data:source %s" % self._channel_name[index])
+            self._waveform_source = index
+            self._set_cache_valid(True, 'waveform_source')
+        if not self._get_cache_valid('waveform_format'):
+            self._write(":data:encdg fastest")
+            self._write(":data:width 2")
+            self._write(":data:start 1")
+            self._write(":data:stop 1e10")
+            self._set_cache_valid(True, 'waveform_format')
 
         trace = ivi.TraceYT()
 
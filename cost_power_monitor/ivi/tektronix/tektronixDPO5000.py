@@ -37,7 +37,7 @@ ScreenshotImageFormatMapping = {
         'jpeg': 'jpeg',
         'pcx': 'pcx'}
 
-class tektronixDPO5000(tektronixBaseScope):
+class tektronixDPO5000(tektronixBaseScope, scope.SegmentedAcquisition):
     "Tektronix DPO5000 series IVI oscilloscope driver"
 
     def __init__(self, *args, **kwargs):
@@ -121,21 +121,67 @@ class tektronixDPO5000(tektronixBaseScope):
         if self._driver_operation_simulate:
             return ivi.TraceYT()
 
-        self._write(":data:source %s" % self._channel_name[index])
+        return self._fetch_waveform(index)
+
+    def _measurement_fetch_waveforms(self, indices):
+        indices = [ivi.get_index(self._channel_name, index) for index in indices]
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for index in indices]
+
+        if len(indices) < 2 or len(set(indices)) != len(indices):
+            return super(tektronixDPO5000, self)._measurement_fetch_waveforms(indices)
+
+        # The preamble describes the first source only, so it is read per
+        # channel, then one curve? query returns a block for each source
+        self._setup_waveform_transfer()
+        preambles = [self._fetch_waveform_preamble(index) for index in indices]
+        self._write(":data:source %s" % ','.join(self._channel_name[index] for index in indices))
+        self._write(":curve?")
+        traces = [self._waveform_trace(preamble, self._read_ieee_block())
+                  for preamble in preambles]
+        self._read_raw() # flush buffer
+        return traces
+
+    def _fetch_waveform(self, index, segments=1):
+        "Reads a waveform, with segments the FastFrame frames as one trace"
+        self._setup_waveform_transfer()
+        preamble = self._fetch_waveform_preamble(index)
+
+        # Read waveform data
+        raw_data = self._ask_for_ieee_block(":curve?")
+        self._read_raw() # flush buffer
+
+        return self._waveform_trace(preamble, raw_data, segments)
+
+    def _setup_waveform_transfer(self):
         self._write(":data:encdg fastest")
         self._write(":data:width 2")
         self._write(":data:start 1")
         self._write(":data:stop 1e10")
 
-        trace = ivi.TraceYT()
-
-        # Read preamble
+    def _fetch_waveform_preamble(self, index):
+        "Selects the source and reads its preamble"
+        self._write(":data:source %s" % self._channel_name[index])
         pre = self._ask(":wfmoutpre?").split(';')
 
         acq_format = pre[7].strip().upper()
+        point_enc = pre[2].strip().upper()
+
+        if acq_format != 'Y':
+            raise UnexpectedResponseException()
+
+        if point_enc != 'BINARY':
+            raise UnexpectedResponseException()
+
+        return pre
+
+    def _waveform_trace(self, pre, raw_data, segments=1):
+        "Returns the trace of the raw data read after the preamble pre"
+        trace = ivi.TraceYT()
+
         points = int(pre[6])
         point_size = int(pre[0])
-        point_enc = pre[2].strip().upper()
         point_fmt = pre[3].strip().upper()
         byte_order = pre[4].strip().upper()
         trace.x_increment = float(pre[9])
@@ -145,15 +191,9 @@ class tektronixDPO5000(tektronixBaseScope):
         trace.y_reference = int(float(pre[14]))
         trace.y_origin = float(pre[15])
 
-        if acq_format != 'Y':
-            raise UnexpectedResponseException()
-
-        if point_enc != 'BINARY':
-            raise UnexpectedResponseException()
-
-        # Read waveform data
-        raw_data = self._ask_for_ieee_block(":curve?")
-        self._read_raw() # flush buffer
+        # The frames from framestart to framestop come one after another
+        if segments > 1:
+            points = len(raw_data) // point_size
 
         # Store in trace object
         if point_fmt == 'RP' and point_size == 1:
@@ -175,5 +215,40 @@ class tektronixDPO5000(tektronixBaseScope):
         if (byte_order == 'LSB') != (sys.byteorder == 'little'):
             trace.y_raw.byteswap()
 
+        if segments > 1:
+            return self._split_waveform_segments(trace, segments)
         return trace
 
+    def _get_acquisition_segment_count(self):
+        if not self._driver_operation_simulate and not self._get_cache_valid():
+            if int(self._ask(":horizontal:fastframe:state?")):
+                self._acquisition_segment_count = int(self._ask(":horizontal:fastframe:count?"))
+            else:
+                self._acquisition_segment_count = 1
+            self._set_cache_valid()
+        return self._acquisition_segment_count
+
+    def _set_acquisition_segment_count(self, value):
+        value = int(value)
+        if value < 1:
+            raise ivi.OutOfRangeException()
+        if not self._driver_operation_simulate:
+            if value > 1:
+                self._write(":horizontal:fastframe:state 1")
+                self._write(":horizontal:fastframe:count %d" % value)
+                self._write(":data:framestart 1")
+                self._write(":data:framestop %d" % value)
+            else:
+                self._write(":horizontal:fastframe:state 0")
+        self._acquisition_segment_count = value
+        self._set_cache_valid()
+
+    def _measurement_fetch_waveform_segments(self, index):
+        index = ivi.get_index(self._channel_name, index)
+        count = self._get_acquisition_segment_count()
+
+        if self._driver_operation_simulate:
+            return [ivi.TraceYT() for i in range(count)]
+
+        return self._fetch_waveform(index, count)
+
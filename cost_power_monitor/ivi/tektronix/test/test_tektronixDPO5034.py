@@ -0,0 +1,103 @@
+"""
+
+Python Interchangeable Virtual Instrument Library
+
+Copyright (c) 2014-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import io
+import unittest
+
+import numpy as np
+
+from .. import tektronixDPO5034
+
+class VirtualDPO5034(object):
+    def __init__(self):
+        self.read_buffer = io.BytesIO()
+        self.cmd_log = list()
+
+        self.sources = ['ch1']
+        self.waveforms = dict()
+        self.ymult = dict()
+
+    def set_waveform(self, channel, y, ymult=1.0):
+        self.waveforms[channel] = np.array(y, dtype='<i2')
+        self.ymult[channel] = ymult
+
+    def preamble(self, channel):
+        points = len(self.waveforms[channel])
+        return ('2;16;BINARY;RI;LSB;"%s";%d;Y;"s";1e-9;-5e-7;0;"V";%r;0;0.5'
+                % (channel, points, self.ymult[channel]))
+
+    def write_raw(self, data):
+        cmd = data.decode().strip().lower()
+        self.cmd_log.append(cmd)
+        response = None
+
+        if cmd.startswith(':data:source '):
+            self.sources = cmd.split(' ')[1].split(',')
+        elif cmd == ':wfmoutpre?':
+            response = self.preamble(self.sources[0]).encode()
+        elif cmd == ':curve?':
+            blocks = []
+            for channel in self.sources:
+                block = self.waveforms[channel].tobytes()
+                blocks.append(b'#9%09d' % len(block) + block)
+            response = b','.join(blocks)
+
+        if response is not None:
+            self.read_buffer = io.BytesIO(response + b'\n')
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+
+class TestTektronixDPO5034(unittest.TestCase):
+
+    def setUp(self):
+        self.vscope = VirtualDPO5034()
+        self.scope = tektronixDPO5034(self.vscope)
+        self.vscope.set_waveform('ch1', [1, 2, 3], 0.5)
+        self.vscope.set_waveform('ch2', [-4, 5, -6], 0.25)
+        self.vscope.set_waveform('ch3', [7, 8, 9])
+
+    def test_fetch_waveform(self):
+        trace = self.scope.channels[1].measurement.fetch_waveform()
+        np.testing.assert_allclose(trace.y, np.array([-4, 5, -6]) * 0.25 + 0.5)
+        np.testing.assert_allclose(trace.t, -5e-7 + np.arange(3) * 1e-9)
+
+    def test_fetch_waveforms(self):
+        traces = self.scope.measurement.fetch_waveforms([2, 'ch1'])
+        self.assertEqual(self.vscope.cmd_log.count(':curve?'), 1)
+        self.assertTrue(':data:source ch3,ch1' in self.vscope.cmd_log)
+        np.testing.assert_allclose(traces[0].y, np.array([7, 8, 9]) + 0.5)
+        np.testing.assert_allclose(traces[1].y, np.array([1, 2, 3]) * 0.5 + 0.5)
+
+    def test_fetch_waveforms_fallback(self):
+        traces = self.scope.measurement.fetch_waveforms([1, 1])
+        self.assertEqual(self.vscope.cmd_log.count(':curve?'), 2)
+        np.testing.assert_allclose(traces[1].y, np.array([-4, 5, -6]) * 0.25 + 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
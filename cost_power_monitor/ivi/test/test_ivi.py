@@ -24,8 +24,13 @@ THE SOFTWARE.
 
 """
 
+import array
+import io
+import pickle
 import unittest
 
+import numpy as np
+
 import ivi
 
 class TestIndex(unittest.TestCase):
@@ -57,5 +62,197 @@ class TestIndex(unittest.TestCase):
         self.assertRaises(ivi.SelectorRangeException, ivi.get_index, self.index_dict, 100);
         self.assertRaises(ivi.SelectorNameException, ivi.get_index, self.index_dict, 'bad_item');
 
+class TestPropertyCollection(unittest.TestCase):
+
+    def setUp(self):
+        self.value = 1
+        self.obj = ivi.PropertyCollection()
+        self.obj._add_property('value', self._get_value, self._set_value)
+        self.obj._add_property('read_only', self._get_value)
+        self.obj._add_method('method', self._get_value)
+        self.obj._lock()
+
+    def _get_value(self):
+        return self.value
+
+    def _set_value(self, value):
+        self.value = value
+
+    def test_property(self):
+        self.assertEqual(self.obj.value, 1)
+        self.obj.value = 2
+        self.assertEqual(self.value, 2)
+        self.assertEqual(self.obj.read_only, 2)
+        self.assertEqual(self.obj.method(), 2)
+        self.assertRaises(AttributeError, setattr, self.obj, 'read_only', 3)
+
+    def test_own_class(self):
+        obj = ivi.PropertyCollection()
+        obj._add_property('value', lambda: 3)
+        self.assertEqual(obj.value, 3)
+        self.assertEqual(self.obj.value, 1)
+        self.assertIsInstance(obj, ivi.PropertyCollection)
+        self.assertFalse(hasattr(ivi.PropertyCollection, 'value'))
+
+    def test_lock(self):
+        self.assertRaises(AttributeError, setattr, self.obj, 'other', 1)
+        self.obj._unlock()
+        self.obj.other = 1
+        self.assertEqual(self.obj.other, 1)
+
+    def test_del_property(self):
+        self.obj._del_property('value')
+        self.assertFalse(hasattr(self.obj, 'value'))
+
+class VirtualInstrument(object):
+    def __init__(self, data):
+        self.read_buffer = io.BytesIO(data)
+
+    def write_raw(self, data):
+        pass
+
+    def read_raw(self, num=-1):
+        return self.read_buffer.read(num)
+
+class TestIeeeBlock(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 40
+        self.block = b'junk#9%09d' % len(self.data) + self.data + b'\n'
+
+    def test_read(self):
+        driver = ivi.Driver(VirtualInstrument(self.block))
+        self.assertEqual(driver._read_ieee_block(), self.data)
+        self.assertEqual(driver._read_raw(), b'\n')
+
+    def test_read_indefinite(self):
+        driver = ivi.Driver(VirtualInstrument(b'#0' + self.data))
+        self.assertEqual(driver._read_ieee_block(), self.data)
+
+    def test_read_chunks(self):
+        driver = ivi.Driver(VirtualInstrument(self.block))
+        chunks = list(driver._read_ieee_block_chunks(1000))
+        self.assertEqual([len(c) for c in chunks], [1000] * 10 + [240])
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertEqual(driver._read_raw(), b'\n')
+
+    def test_read_into(self):
+        driver = ivi.Driver(VirtualInstrument(self.block))
+        buffer = np.zeros(len(self.data) // 2 + 1, dtype='>i2')
+        self.assertEqual(driver._read_ieee_block_into(buffer, 1000), len(self.data))
+        self.assertEqual(buffer[:-1].tobytes(), self.data)
+        self.assertEqual(driver._read_raw(), b'\n')
+
+    def test_read_into_too_small(self):
+        driver = ivi.Driver(VirtualInstrument(self.block))
+        buffer = bytearray(len(self.data) - 1)
+        self.assertRaises(ivi.OutOfRangeException, driver._read_ieee_block_into, buffer)
+
+class TestTraceYT(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = np.array([1, 0, 3, 4], dtype='>i2').tobytes()
+        self.trace = ivi.TraceYT()
+        self.trace.y_raw = np.frombuffer(self.raw, dtype='>i2')
+        self.trace.y_increment = 0.5
+        self.trace.y_origin = 1
+        self.trace.y_reference = 1
+        self.trace.y_hole = 0
+        self.trace.x_increment = 2
+        self.trace.x_origin = 10
+
+    def test_scaling(self):
+        np.testing.assert_array_equal(self.trace.t, [10, 12, 14, 16])
+        np.testing.assert_array_equal(self.trace.y, [1, np.nan, 2, 2.5])
+        self.assertEqual(self.trace[2], (14, 2))
+        self.assertEqual(list(self.trace)[3], (16, 2.5))
+
+    def test_cache(self):
+        self.assertIs(self.trace.y, self.trace.y)
+        self.assertIs(self.trace.t, self.trace.t)
+        self.assertFalse(self.trace.y.flags.writeable)
+        self.trace.y_origin = 0
+        np.testing.assert_array_equal(self.trace.y, [0, np.nan, 1, 1.5])
+
+    def test_array(self):
+        data = np.asarray(self.trace)
+        self.assertEqual(data.shape, (4, 2))
+        np.testing.assert_array_equal(data[:,0], self.trace.t)
+        np.testing.assert_array_equal(data[:,1], self.trace.y)
+        np.testing.assert_array_equal(np.asarray(self.trace), np.array(list(self.trace)))
+
+    def test_no_copy(self):
+        y_raw = array.array('H', [1, 2, 3])
+        self.trace.y_raw = y_raw
+        self.trace.y
+        self.assertIs(self.trace.y_raw, y_raw)
+        block = bytearray(b'\x01\x00\x02\x00')
+        self.trace.y_raw = np.frombuffer(block, dtype='<u2')
+        block[0] = 5
+        # the trace reads the block itself
+        self.assertEqual(self.trace[0][1], (5 - 1) * 0.5 + 1)
+
+    def test_array_copy(self):
+        np.testing.assert_array_equal(np.asarray(self.trace)[:,1], self.trace.y)
+        np.testing.assert_array_equal(self.trace.__array__(copy=True), np.asarray(self.trace))
+        self.assertRaises(ValueError, self.trace.__array__, copy=False)
+        trace = ivi.TraceY()
+        trace.y_raw = np.array([1, 2, 3])
+        self.assertTrue(np.shares_memory(trace.__array__(copy=False), trace.y))
+        self.assertFalse(np.shares_memory(trace.__array__(copy=True), trace.y))
+        self.assertRaises(ValueError, trace.__array__, dtype='f4', copy=False)
+        self.assertEqual(trace.__array__(dtype='f4').dtype, np.dtype('f4'))
+
+    def test_pickle(self):
+        self.trace.y
+        self.assertFalse('_cache' in self.trace.__getstate__())
+        trace = pickle.loads(pickle.dumps(self.trace))
+        np.testing.assert_array_equal(trace.y, self.trace.y)
+
+class TestBitPlanes(unittest.TestCase):
+
+    def test_bytes(self):
+        planes = ivi.unpack_bit_planes(np.array([0x01, 0x82, 0xff], dtype='B'))
+        self.assertEqual(planes.shape, (8, 3))
+        np.testing.assert_array_equal(planes[0], [1, 0, 1])
+        np.testing.assert_array_equal(planes[1], [0, 1, 1])
+        np.testing.assert_array_equal(planes[7], [0, 1, 1])
+        for k in range(8):
+            np.testing.assert_array_equal(planes[k], (np.array([0x01, 0x82, 0xff]) >> k) & 1)
+
+    def test_words(self):
+        data = np.array([0x0001, 0x8100, 0xffff], dtype='>u2')
+        planes = ivi.unpack_bit_planes(data)
+        self.assertEqual(planes.shape, (16, 3))
+        for k in range(16):
+            np.testing.assert_array_equal(planes[k], (data.astype(int) >> k) & 1)
+
+    def test_bits(self):
+        planes = ivi.unpack_bit_planes(array.array('H', [3, 4]), 3)
+        np.testing.assert_array_equal(planes, [[1, 0], [1, 0], [0, 1]])
+        self.assertRaises(ValueError, ivi.unpack_bit_planes, np.array([1.5]))
+
+class TestCacheTag(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = ivi.Driver()
+
+    def _get_test_value(self, index=-1):
+        return self.driver._get_cache_valid(index=index)
+
+    def _set_test_value(self, valid=True, index=-1):
+        self.driver._set_cache_valid(valid, index=index)
+
+    def test_tag_from_caller(self):
+        self.assertFalse(self._get_test_value())
+        self._set_test_value()
+        self.assertTrue(self._get_test_value())
+        self.assertTrue(self.driver._get_cache_valid('test_value'))
+        self._set_test_value(index=2)
+        self.assertTrue(self.driver._cache_valid['test_value_2'])
+        self.driver.driver_operation.invalidate_all_attributes()
+        self.assertFalse(self._get_test_value())
+
+
 if __name__ == '__main__':
     unittest.main()
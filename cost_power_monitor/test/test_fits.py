@@ -0,0 +1,173 @@
+import contextlib
+import io
+import queue
+import unittest
+
+import numpy as np
+
+from .. import cost_power_monitor as cpm
+
+frequency = 13.56e6
+dt = 1e-9
+samples = 2000
+noise = 0.01
+
+
+def sine(amplitude, phase, seed=0, offset=0.05):
+    "Sampled amplitude*sin(2 pi f t + phase) with gaussian noise"
+    rng = np.random.RandomState(seed)
+    t = np.arange(samples) * dt + 3e-7
+    y = amplitude * np.sin(2*np.pi*frequency*t + phase) + offset
+    return t, y + rng.normal(0, noise, samples)
+
+
+def phase_error(phase, expected):
+    return abs((phase - expected + np.pi) % (2*np.pi) - np.pi)
+
+
+class TestSineFit(unittest.TestCase):
+
+    def check(self, fit, amplitude, phase, tolerance=1e-2):
+        a, f, p = fit
+        self.assertAlmostEqual(a / amplitude, 1, delta=tolerance)
+        self.assertAlmostEqual(f / frequency, 1, delta=1e-3)
+        self.assertLess(phase_error(p, phase), tolerance)
+
+    def test_engines(self):
+        for engine in cpm.fit_engines:
+            for amplitude, phase in [(1.3, 0.7), (0.2, 4.0), (5.0, 2*np.pi - 0.1)]:
+                t, y = sine(amplitude, phase)
+                with self.subTest(engine=engine, amplitude=amplitude, phase=phase):
+                    self.check(cpm.fit_func(np.column_stack((t, y)), engine), amplitude, phase)
+
+    def test_sine4_refines_frequency(self):
+        t, y = sine(1, 1)
+        a, f, p = cpm.sine4_fit(t, y)
+        self.assertAlmostEqual(f / frequency, 1, delta=1e-5)
+
+    def test_peak_bin(self):
+        n = 1024
+        for k in [50.0, 50.25, 50.5, 50.8]:
+            x = np.sin(2*np.pi*k*np.arange(n)/n) * np.hanning(n)
+            spectrum = np.abs(np.fft.rfft(x))
+            self.assertAlmostEqual(cpm.peak_bin(spectrum), k, delta=0.02)
+        spectra = np.abs(np.fft.rfft([np.sin(2*np.pi*k*np.arange(n)/n) * np.hanning(n)
+                                      for k in [30.3, 70.6]]))
+        np.testing.assert_allclose(cpm.peak_bin(spectra), [30.3, 70.6], atol=0.02)
+
+    def test_batch_matches_single(self):
+        frames = [sine(1 + 0.1*i, 0.5*i, seed=i) for i in range(6)]
+        time = np.stack([t for t, y in frames])
+        amplitude = np.stack([y for t, y in frames])
+        batch = cpm.sine_fit_batch(time, amplitude)
+        for i, (t, y) in enumerate(frames):
+            single = cpm.sine_fit(t, y)
+            np.testing.assert_allclose([b[i] for b in batch], single, rtol=1e-9, atol=1e-9)
+
+    def test_cross_spectrum_fit(self):
+        t, v = sine(1.3, 0.7, seed=1)
+        t, c = sine(0.4, 2.2, seed=2)
+        (va, vf, vp), (ca, cf, cp) = cpm.cross_spectrum_fit(t, v, c)
+        self.assertEqual(vf, cf)
+        self.check((va, vf, vp), 1.3, 0.7)
+        self.check((ca, cf, cp), 0.4, 2.2)
+
+    def test_fit_pair(self):
+        t, v = sine(1.3, 0.7, seed=1)
+        t, c = sine(0.4, 2.2, seed=2)
+        voltage, current = np.column_stack((t, v)), np.column_stack((t, c))
+        for engine in cpm.fit_engines:
+            with self.subTest(engine=engine):
+                v_fit, c_fit = cpm.fit_pair(voltage, current, engine)
+                self.check(v_fit, 1.3, 0.7)
+                self.check(c_fit, 0.4, 2.2)
+        # different time axes fall back to single channel fits
+        shifted = np.column_stack((t + 0.5*dt, c))
+        self.assertEqual(cpm.fit_pair(voltage, shifted, 'cross')[1],
+                         cpm.fit_func(shifted, 'cross'))
+
+
+class TestPower(unittest.TestCase):
+
+    def frames(self, count=5):
+        frames = []
+        for i in range(count):
+            t, v = sine(1.0 + 0.1*i, 0.3, seed=2*i)
+            t, c = sine(0.5, 0.3 + np.pi/2 + 0.2*i, seed=2*i+1)
+            frames.append({'voltage': np.column_stack((t, v)),
+                           'current': np.column_stack((t, c))})
+        return frames
+
+    def test_phaseshift_power(self):
+        # current phase is pi/2 + 0.2 i ahead, which is a phase shift of -0.2 i
+        for i, frame in enumerate(self.frames()):
+            for engine in cpm.fit_engines:
+                with self.subTest(frame=i, engine=engine):
+                    v_rms, c_rms, shift, power = cpm.phaseshift_power(frame, 2, 4, 0, 0, engine)
+                    self.assertAlmostEqual(v_rms / ((1.0 + 0.1*i) / np.sqrt(2) * 2), 1, delta=1e-2)
+                    self.assertAlmostEqual(c_rms / (0.5 / np.sqrt(2) / 4), 1, delta=1e-2)
+                    self.assertLess(phase_error(shift, -0.2*i), 1e-2)
+                    self.assertAlmostEqual(power, v_rms * c_rms * abs(np.cos(0.2*i)), delta=1e-2*power)
+
+    def test_batch_matches_single(self):
+        frames = self.frames()
+        batch = cpm.phaseshift_batch(frames, 2, 4, 0.1, 0.2)
+        self.assertEqual(len(batch), len(frames))
+        for frame, result in zip(frames, batch):
+            single = cpm.phaseshift_power(frame, 2, 4, 0.1, 0.2, 'sine3')
+            np.testing.assert_allclose(result, single, rtol=1e-9)
+        self.assertEqual(cpm.fit_frames(frames, 2, 4, 0.1, 0.2, 'phaseshift', 'sine3'), batch)
+
+
+class FakeRing(object):
+    "Ring that hands out the data_dicts of the frames themselves"
+    def __init__(self):
+        self.busy = set()
+
+    def read(self, frame):
+        return frame['data_dict']
+
+    def release(self, frame):
+        self.busy.discard(frame['slot'])
+
+
+class TestFitWorker(unittest.TestCase):
+
+    def run_worker(self, engine, count=4, broken=()):
+        data_queue = queue.Queue()
+        result_queue = queue.Queue()
+        ring = FakeRing()
+        settings = {'volcal': 1, 'resistance': 1, 'v_ref': 0, 'c_ref': 0,
+                    'method': 'phaseshift', 'engine': engine}
+        for i, data_dict in enumerate(TestPower().frames(count)):
+            if i in broken:
+                del data_dict['current']
+            ring.busy.add(i)
+            data_queue.put({'slot': i, 'data_dict': data_dict, 'settings': settings})
+        data_queue.put(None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpm.fit_worker(data_queue, ring, result_queue, batch=16)
+        results = []
+        while not result_queue.empty():
+            results.append(result_queue.get())
+        return results, ring
+
+    def test_batch_only_batched_fits(self):
+        results, ring = self.run_worker('leastsq')
+        self.assertEqual([len(r) for r in results], [1, 1, 1, 1])
+        self.assertEqual(ring.busy, set())
+        results, ring = self.run_worker('sine3')
+        self.assertEqual([len(r) for r in results], [4])
+        self.assertEqual(ring.busy, set())
+
+    def test_failed_fit_releases_slots(self):
+        results, ring = self.run_worker('leastsq', broken=[1])
+        self.assertEqual([len(r) for r in results], [1, 1, 1])
+        self.assertEqual(ring.busy, set())
+        results, ring = self.run_worker('sine3', broken=[1])
+        self.assertEqual([len(r) for r in results], [3])
+        self.assertEqual(ring.busy, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import contextlib
+import io
+import queue
+import threading
+import unittest
+from unittest import mock
+
+from usb import USBError
+
+from .. import cost_power_monitor as cpm
+from .. import usbtmc
+
+
+class UnpluggedScope(object):
+    "Scope whose USB device is gone"
+    def __init__(self):
+        self.measurement = self
+
+    def fetch_waveforms(self, indices):
+        raise USBError("No such device")
+
+    def close(self):
+        raise USBError("No such device")
+
+
+class CountingRing(object):
+    "Ring that only keeps track of the busy slots"
+    def __init__(self):
+        self.busy = set()
+
+    def write(self, data_dict, timeout=None):
+        slot = len(self.busy)
+        self.busy.add(slot)
+        return {'slot': slot}
+
+    def release(self, frame):
+        self.busy.discard(frame['slot'])
+
+
+class TestAcquisitionService(unittest.TestCase):
+
+    def setUp(self):
+        # the service without its process, the commands are run directly
+        self.service = cpm.acquisition_service.__new__(cpm.acquisition_service)
+        self.service.scope = UnpluggedScope()
+        self.service.scope_id = 'USB::1::2::INSTR'
+        self.service.scope_failed = False
+        self.service.tuned = True
+        self.service.current_run = None
+        self.service.options = cpm.service_options()
+
+    def test_usb_errors_end_run(self):
+        frames = queue.Queue()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.read_frames(self.service.scope, 0, {1: 'voltage', 2: 'current'}, 1,
+                                     frames, cpm.stage_timer(), threading.Event())
+        self.assertIsInstance(frames.get_nowait(), USBError)
+        self.assertTrue(self.service.scope_failed)
+
+    def test_reopen_failed_scope(self):
+        with mock.patch.object(cpm, 'get_scope', lambda scope_id: 'scope'):
+            self.service.open_scope('USB::1::2::INSTR')
+            self.assertIsInstance(self.service.scope, UnpluggedScope)
+            self.service.scope_failed = True
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.service.open_scope('USB::1::2::INSTR')
+            self.assertEqual(self.service.scope, 'scope')
+            self.assertFalse(self.service.scope_failed)
+
+    def test_stop_releases_unqueued_frame(self):
+        self.service.ring = CountingRing()
+        frames = queue.Queue()
+        frames.put({'voltage': [0.0]})
+        data_queue = cpm.frame_queue(1)
+        data_queue.put('full')
+        stopped = threading.Event()
+        timer = threading.Timer(0.3, stopped.set)
+        timer.start()
+        self.service.io_worker(frames, data_queue, {}, cpm.stage_timer(), stopped)
+        timer.join()
+        self.assertEqual(self.service.ring.busy, set())
+
+    def test_tune_usb(self):
+        scope = mock.MagicMock()
+        scope._interface = mock.Mock(spec=usbtmc.Instrument)
+        scope._interface.load_tuning.return_value = None
+        channels = {1: 'nothing', 2: 'nothing'}
+        self.service.tune_usb(scope, {1: 'voltage'})
+        self.service.tune_usb(scope, channels, measure=True)
+        self.assertFalse(scope._interface.tune.called)
+        scope._interface.tune.return_value = (65536, 10.0)
+        channels[2] = 'current'
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.service.tune_usb(scope, channels, measure=True)
+        scope._interface.tune.assert_called_once_with(scope.channels[1].measurement.fetch_waveform)
+
+    def test_request_drops_late_replies(self):
+        self.service.requests = 1
+        self.service.command_queue = queue.Queue()
+        self.service.reply_queue = queue.Queue()
+        self.service.reply_queue.put((1, 'late'))
+        self.service.reply_queue.put((2, 'reply'))
+        self.assertEqual(self.service.request('stop'), 'reply')
+        self.assertEqual(self.service.command_queue.get_nowait(), (2, 'stop'))
+
+    def test_request_service_ended(self):
+        self.service.requests = 0
+        self.service.command_queue = queue.Queue()
+        self.service.reply_queue = queue.Queue()
+        self.service.process = mock.Mock()
+        self.service.process.is_alive.return_value = False
+        self.assertRaises(IOError, self.service.request, 'stop')
+        self.service.process.is_alive.return_value = True
+        with mock.patch.object(cpm, 'request_timeout', 0):
+            self.assertRaises(IOError, self.service.request, 'stop')
+
+    def test_pickled_without_process(self):
+        self.service.process = mock.Mock()
+        self.assertNotIn('process', self.service.__getstate__())
+        self.assertEqual(self.service.__getstate__()['scope_id'], 'USB::1::2::INSTR')
+
+
+if __name__ == '__main__':
+    unittest.main()
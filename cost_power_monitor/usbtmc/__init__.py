@@ -28,3 +28,4 @@ __all__ = ["usbtmc"]
 
 from .version import __version__
 from .usbtmc import Instrument, list_devices, list_resources
+from .aio import AsyncInstrument
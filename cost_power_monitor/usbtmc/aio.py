@@ -0,0 +1,165 @@
+"""
+
+Python USBTMC driver
+
+Copyright (c) 2012-2017 Alex Forencich
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import asyncio
+import concurrent.futures
+
+from .usbtmc import Instrument
+
+
+class AsyncInstrument(object):
+    """
+    asyncio USBTMC instrument interface client
+
+    Takes the same arguments as Instrument, or an Instrument. All transfers
+    of one instrument run one after another in an I/O thread of its own, so
+    an event loop can drive several instruments at once, and calls queued
+    while a transfer is in progress are started as soon as it is done.
+
+        scope = AsyncInstrument("USB::0x05ff::0x1023::INSTR")
+        dmm = AsyncInstrument("USB::0x0957::0x0607::INSTR")
+        idn, value = await asyncio.gather(scope.ask("*IDN?"), dmm.ask("READ?"))
+
+    blocking is a synchronous interface to the same instrument going through
+    the same thread, e.g. for ivi drivers, which take an AsyncInstrument as
+    resource and use it.
+
+    close (of either interface) closes the instrument and ends the thread.
+
+    Each transfer is still one blocking pyusb call in that thread, so there
+    is only one bulk-IN request in flight per instrument at a time. pyusb
+    only offers blocking transfers, so several requests can't be queued
+    and the bus can idle between transfers, as with Instrument.
+    """
+    def __init__(self, *args, **kwargs):
+        if len(args) == 1 and isinstance(args[0], Instrument):
+            self.instrument = args[0]
+        else:
+            self.instrument = Instrument(*args, **kwargs)
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.blocking = BlockingInstrument(self.instrument, self.executor)
+
+    async def _call(self, f, *args):
+        # the running loop, get_running_loop needs python 3.7
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, f, *args)
+
+    async def open(self):
+        return await self._call(self.instrument.open)
+
+    async def close(self):
+        try:
+            return await self._call(self.instrument.close)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def write_raw(self, data):
+        "Write binary data to instrument"
+        return await self._call(self.instrument.write_raw, data)
+
+    async def read_raw(self, num=-1):
+        "Read binary data from instrument"
+        return await self._call(self.instrument.read_raw, num)
+
+    async def ask_raw(self, data, num=-1):
+        "Write then read binary data"
+        return await self._call(self.instrument.ask_raw, data, num)
+
+    async def write(self, message, encoding='utf-8'):
+        "Write string to instrument"
+        return await self._call(self.instrument.write, message, encoding)
+
+    async def read(self, num=-1, encoding='utf-8'):
+        "Read string from instrument"
+        return await self._call(self.instrument.read, num, encoding)
+
+    async def ask(self, message, num=-1, encoding='utf-8'):
+        "Write then read string"
+        return await self._call(self.instrument.ask, message, num, encoding)
+
+    async def read_stb(self):
+        "Read status byte"
+        return await self._call(self.instrument.read_stb)
+
+    async def trigger(self):
+        "Send trigger command"
+        return await self._call(self.instrument.trigger)
+
+    async def clear(self):
+        "Send clear command"
+        return await self._call(self.instrument.clear)
+
+
+class BlockingInstrument(object):
+    "Synchronous calls to an instrument, run in the I/O thread of an AsyncInstrument"
+    def __init__(self, instrument, executor):
+        self.instrument = instrument
+        self.executor = executor
+
+    def _call(self, f, *args):
+        return self.executor.submit(f, *args).result()
+
+    def open(self):
+        return self._call(self.instrument.open)
+
+    def close(self):
+        try:
+            return self._call(self.instrument.close)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def write_raw(self, data):
+        return self._call(self.instrument.write_raw, data)
+
+    def read_raw(self, num=-1):
+        return self._call(self.instrument.read_raw, num)
+
+    def ask_raw(self, data, num=-1):
+        return self._call(self.instrument.ask_raw, data, num)
+
+    def write(self, message, encoding='utf-8'):
+        return self._call(self.instrument.write, message, encoding)
+
+    def read(self, num=-1, encoding='utf-8'):
+        return self._call(self.instrument.read, num, encoding)
+
+    def ask(self, message, num=-1, encoding='utf-8'):
+        return self._call(self.instrument.ask, message, num, encoding)
+
+    def read_stb(self):
+        return self._call(self.instrument.read_stb)
+
+    def trigger(self):
+        return self._call(self.instrument.trigger)
+
+    def clear(self):
+        return self._call(self.instrument.clear)
+
+    def remote(self):
+        return self._call(self.instrument.remote)
+
+    def local(self):
+        return self._call(self.instrument.local)
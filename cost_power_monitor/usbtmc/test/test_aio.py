@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import unittest
+
+from .. import usbtmc
+from ..aio import AsyncInstrument
+
+
+class FakeInstrument(usbtmc.Instrument):
+    "Instrument that answers every query with its last message, upper case"
+    def __init__(self):
+        super(FakeInstrument, self).__init__(object())
+        self.last = b''
+        self.threads = set()
+        self.log = []
+
+    def open(self):
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+    def write_raw(self, data):
+        self.threads.add(threading.get_ident())
+        self.log.append(data)
+        self.last = data
+
+    def read_raw(self, num=-1):
+        self.threads.add(threading.get_ident())
+        return self.last.upper()
+
+
+class TestAsyncInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeInstrument()
+        self.instr = AsyncInstrument(self.fake)
+
+    def test_round_trip(self):
+        async def run():
+            await self.instr.open()
+            await self.instr.write("*rst")
+            answers = await asyncio.gather(self.instr.ask("a?"), self.instr.ask("b?"),
+                                           self.instr.ask_raw(b"c?"))
+            await self.instr.close()
+            return answers
+
+        self.assertEqual(asyncio.run(run()), ["A?", "B?", b"C?"])
+        self.assertEqual(self.fake.log, [b"*rst", b"a?", b"b?", b"c?"])
+        self.assertFalse(self.fake.connected)
+        # all transfers in the one I/O thread, which is gone after close
+        self.assertEqual(len(self.fake.threads), 1)
+        self.assertNotIn(threading.get_ident(), self.fake.threads)
+        self.assertRaises(RuntimeError, self.instr.executor.submit, print)
+
+    def test_blocking(self):
+        self.instr.blocking.open()
+        self.assertEqual(self.instr.blocking.ask("idn?"), "IDN?")
+        self.instr.blocking.close()
+        self.assertFalse(self.fake.connected)
+        self.assertRaises(RuntimeError, self.instr.executor.submit, print)
+
+
+if __name__ == '__main__':
+    unittest.main()
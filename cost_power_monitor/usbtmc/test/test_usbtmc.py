@@ -0,0 +1,109 @@
+import array
+import struct
+import unittest
+from unittest import mock
+
+from .. import usbtmc
+
+
+class FakeDevice(object):
+    def __init__(self, address, idVendor=0x0aad, idProduct=0x0197):
+        self.bus = 1
+        self.address = address
+        self.idVendor = idVendor
+        self.idProduct = idProduct
+
+
+class TestFindDevice(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = [FakeDevice(3), FakeDevice(4, 0x1234, 0x5678)]
+        patches = [mock.patch.object(usbtmc.usb.core, 'find', lambda find_all: iter(self.bus)),
+                   mock.patch.object(usbtmc, 'is_usbtmc_device', lambda dev: dev.idVendor == 0x0aad),
+                   mock.patch.object(usbtmc, '_devices', dict()),
+                   mock.patch.object(usbtmc, '_other_devices', set())]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_replugged(self):
+        self.assertIs(usbtmc.find_device(0x0aad, 0x0197), self.bus[0])
+        self.assertIs(usbtmc.find_device(0x0aad, 0x0197), self.bus[0])
+        # plugged in again, at a new address
+        self.bus[0] = FakeDevice(7)
+        self.assertIs(usbtmc.find_device(0x0aad, 0x0197), self.bus[0])
+        self.assertEqual(usbtmc.list_devices(), [self.bus[0]])
+
+    def test_unplugged(self):
+        self.assertIsNotNone(usbtmc.find_device(0x0aad, 0x0197))
+        del self.bus[0]
+        self.assertIsNone(usbtmc.find_device(0x0aad, 0x0197))
+        self.assertIsNone(usbtmc.find_device(0x1234, 0x5678))
+
+
+def dev_dep_msg_in(data, eom=True, transfer_size=None):
+    "Bulk in packet with a DEV_DEP_MSG_IN header"
+    if transfer_size is None:
+        transfer_size = len(data)
+    return struct.pack('<BBBxLBxxx', 2, 1, 0xfe, transfer_size, eom) + data
+
+
+class FakeEndpoint(object):
+    "Bulk endpoint pair, reads return the queued packets one by one"
+    def __init__(self, packets):
+        self.packets = list(packets)
+        self.requests = []
+
+    def write(self, data, timeout=None):
+        self.requests.append(data)
+
+    def read(self, size, timeout=None):
+        return array.array('B', self.packets.pop(0)[:size])
+
+
+class TestReadRaw(unittest.TestCase):
+
+    def instrument(self, packets):
+        instr = usbtmc.Instrument(object())
+        instr.connected = True
+        instr.bulk_out_ep = instr.bulk_in_ep = FakeEndpoint(packets)
+        # there is no device to close
+        self.addCleanup(setattr, instr, 'connected', False)
+        return instr
+
+    def test_transfers(self):
+        instr = self.instrument([dev_dep_msg_in(b'#15abc', eom=False),
+                                 dev_dep_msg_in(b'de\n')])
+        data = instr.read_raw()
+        self.assertIs(type(data), bytes)
+        self.assertEqual(data, b'#15abcde\n')
+        self.assertEqual(len(instr.bulk_out_ep.requests), 2)
+        self.assertEqual(instr.bytes_read, 9)
+
+    def test_num(self):
+        instr = self.instrument([dev_dep_msg_in(b'abc', eom=False),
+                                 dev_dep_msg_in(b'def', eom=False)])
+        self.assertEqual(instr.read_raw(6), b'abcdef')
+        self.assertEqual(instr.bulk_out_ep.packets, [])
+
+    def test_rigol_quirk(self):
+        # only the first packet has a header, its transfer size is wrong and
+        # it doesn't signal the end of the message
+        instr = self.instrument([dev_dep_msg_in(b'#210012', eom=False),
+                                 b'3456', b'789\n'])
+        instr.rigol_quirk = True
+        instr.rigol_quirk_ieee_block = True
+        self.assertEqual(instr.read_raw(), b'#2100123456789')
+        self.assertEqual(len(instr.bulk_out_ep.requests), 1)
+        self.assertEqual(instr.bulk_out_ep.packets, [])
+
+    def test_rigol_quirk_transfer_size(self):
+        # without IEEE block, the header's transfer size ends the message
+        instr = self.instrument([dev_dep_msg_in(b'abc', eom=False, transfer_size=5),
+                                 b'def'])
+        instr.rigol_quirk = True
+        self.assertEqual(instr.read_raw(), b'abcde')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,6 +26,7 @@ THE SOFTWARE.
 
 import usb.core
 import usb.util
+import json
 import struct
 import time
 import os
@@ -72,6 +73,9 @@ USBTMC_HEADER_SIZE = 12
 
 RIGOL_QUIRK_PIDS = [0x04ce, 0x0588]
 
+# transfer sizes found by Instrument.tune, per device
+TUNING_FILE = os.path.join(os.path.expanduser('~'), '.usbtmc_tuning.json')
+
 
 def parse_visa_resource_string(resource_string):
     # valid resource strings:
@@ -120,34 +124,84 @@ class UsbtmcException(Exception):
         return self.msg
 
 
-def list_devices():
-    "List all connected USBTMC devices"
+def ieee_block_size(data):
+    "Return the total length of the IEEE block starting data, or None"
+    # IEEE block binary data is prefixed with #lnnnnnnnn
+    # where l is length of n and n is the
+    # length of the data
+    if data[:1] != b'#' or len(data) < 2:
+        return None
+    l = data[1] - 0x30
+    if not 0 < l <= 9 or len(data) < l+2:
+        return None
+    try:
+        return int(bytes(data[2:l+2])) + l+2
+    except ValueError:
+        return None
 
-    def is_usbtmc_device(dev):
-        try:
-            for cfg in dev:
-                d = usb.util.find_descriptor(cfg, bInterfaceClass=USBTMC_bInterfaceClass,
-                                             bInterfaceSubClass=USBTMC_bInterfaceSubClass)
-                if d is not None:
-                    return True
 
-                if dev.idVendor == 0x1334:
-                    # Advantest
+# USBTMC devices found by list_devices by (bus, address, idVendor, idProduct),
+# and the keys of all other devices, so only new devices need to be checked
+_devices = dict()
+_other_devices = set()
+
+
+def is_usbtmc_device(dev):
+    "Check whether a USB device is a USBTMC device"
+    try:
+        for cfg in dev:
+            d = usb.util.find_descriptor(cfg, bInterfaceClass=USBTMC_bInterfaceClass,
+                                         bInterfaceSubClass=USBTMC_bInterfaceSubClass)
+            if d is not None:
+                return True
+
+            if dev.idVendor == 0x1334:
+                # Advantest
+                return True
+
+            if dev.idVendor == 0x0957:
+                # Agilent
+                if dev.idProduct in [0x2818, 0x4218, 0x4418]:
+                    # Agilent U27xx modular devices in firmware update mode
+                    # 0x2818 for U2701A/U2702A (firmware update mode on power up)
+                    # 0x4218 for U2722A (firmware update mode on power up)
+                    # 0x4418 for U2723A (firmware update mode on power up)
                     return True
+    except:
+        pass
+    return False
+
+
+def list_devices(refresh=False):
+    """
+    List all connected USBTMC devices
+
+    The bus is enumerated on every call, so plugged and unplugged devices
+    show up, but only the configurations of devices not seen before are
+    checked. A device plugged in again gets a new address. Devices already
+    known are returned as the same objects as before. Set refresh to check
+    all devices again.
+    """
+    global _devices, _other_devices
+
+    devices = dict()
+    other_devices = set()
+
+    for dev in usb.core.find(find_all=True):
+        key = (dev.bus, dev.address, dev.idVendor, dev.idProduct)
+        if not refresh and key in _devices:
+            devices[key] = _devices[key]
+        elif not refresh and key in _other_devices:
+            other_devices.add(key)
+        elif is_usbtmc_device(dev):
+            devices[key] = dev
+        else:
+            other_devices.add(key)
 
-                if dev.idVendor == 0x0957:
-                    # Agilent
-                    if dev.idProduct in [0x2818, 0x4218, 0x4418]:
-                        # Agilent U27xx modular devices in firmware update mode
-                        # 0x2818 for U2701A/U2702A (firmware update mode on power up)
-                        # 0x4218 for U2722A (firmware update mode on power up)
-                        # 0x4418 for U2723A (firmware update mode on power up)
-                        return True
-        except:
-            pass
-        return False
+    _devices = devices
+    _other_devices = other_devices
 
-    return list(usb.core.find(find_all=True, custom_match=is_usbtmc_device))
+    return list(devices.values())
 
 
 def list_resources():
@@ -191,10 +245,12 @@ def list_resources():
 def find_device(idVendor=None, idProduct=None, iSerial=None):
     "Find USBTMC instrument"
 
-    devs = list_devices()
+    # enumerate again, a device plugged in again has a new address
+    return match_device(list_devices(), idVendor, idProduct, iSerial)
 
-    if len(devs) == 0:
-        return None
+
+def match_device(devs, idVendor=None, idProduct=None, iSerial=None):
+    "Find USBTMC instrument in a list of devices"
 
     for dev in devs:
         # match VID and PID
@@ -263,6 +319,9 @@ class Instrument(object):
         self.support_DT = False
 
         self.max_transfer_size = 1024*1024
+        self.auto_tune = False
+        self.throughput = None
+        self.bytes_read = 0
 
         self.timeout = 1.0
 
@@ -312,6 +371,8 @@ class Instrument(object):
                 self.device = val
             elif op == 'term_char':
                 self.term_char = val
+            elif op == 'auto_tune':
+                self.auto_tune = val
             elif op == 'resource':
                 resource = val
 
@@ -493,6 +554,9 @@ class Instrument(object):
 
         self.get_capabilities()
 
+        if self.auto_tune:
+            self.load_tuning()
+
     def close(self):
         if not self.connected:
             return
@@ -660,11 +724,13 @@ class Instrument(object):
         if self.term_char is not None:
             term_char = self.term_char
 
-        read_data = b''
+        # the transfers are appended to one bytearray, which grows without
+        # copying all the data read so far for every transfer
+        read_data = bytearray()
 
         try:
             while not eom:
-                if not self.rigol_quirk or read_data == b'':
+                if not self.rigol_quirk or not read_data:
 
                     # if the rigol sees this again, it will restart the transfer
                     # so only send it the first time
@@ -672,42 +738,30 @@ class Instrument(object):
                     req = self.pack_dev_dep_msg_in_header(read_len, term_char)
                     self.bulk_out_ep.write(req, timeout=self._timeout_ms)
 
-                resp = self.bulk_in_ep.read(read_len+USBTMC_HEADER_SIZE+3, timeout=self._timeout_ms)
-
-                if sys.version_info >= (3, 2):
-                    resp = resp.tobytes()
-                else:
-                    resp = resp.tostring()
+                resp = memoryview(self.bulk_in_ep.read(read_len+USBTMC_HEADER_SIZE+3, timeout=self._timeout_ms))
 
                 if self.rigol_quirk and read_data:
-                    pass # do nothing, the packet has no header if it isn't the first
+                    data = resp # do nothing, the packet has no header if it isn't the first
                 else:
-                    msgid, btag, btaginverse, transfer_size, transfer_attributes, data = self.unpack_dev_dep_resp_header(resp) 
+                    msgid, btag, btaginverse, transfer_size, transfer_attributes, data = self.unpack_dev_dep_resp_header(resp)
+
+                if self.rigol_quirk and self.rigol_quirk_ieee_block and not read_data:
+                    block_size = ieee_block_size(data)
+                    if block_size is not None:
+                        # ieee block incoming, the transfer_size usbtmc header is lying about the transaction size
+                        transfer_size = block_size
 
+                read_data += data
 
                 if self.rigol_quirk:
                     # rigol devices only send the header in the first packet, and they lie about whether the transaction is complete
-                    if read_data:
-                        read_data += resp
-                    else:
-                        if self.rigol_quirk_ieee_block and data.startswith(b"#"):
-
-                            # ieee block incoming, the transfer_size usbtmc header is lying about the transaction size
-                            l = int(chr(data[1]))
-                            n = int(data[2:l+2])
-
-                            transfer_size = n + (l+2)  # account for ieee header
-
-                        read_data += data
-
                     if len(read_data) >= transfer_size:
-                        read_data = read_data[:transfer_size]  # as per usbtmc spec section 3.2 note 2
+                        del read_data[transfer_size:]  # as per usbtmc spec section 3.2 note 2
                         eom = True
                     else:
                         eom = False
                 else:
                     eom = transfer_attributes & 1
-                    read_data += data
 
                 # Advantest devices never signal EOI and may only send one read packet
                 if self.advantest_quirk:
@@ -726,7 +780,101 @@ class Instrument(object):
                 self._abort_bulk_in()
             raise
 
-        return read_data
+        self.bytes_read += len(read_data)
+        return bytes(read_data)
+
+    def tuning_key(self):
+        "Key of this device in the tuning file"
+        try:
+            serial = self.device.serial_number
+        except (usb.core.USBError, ValueError):
+            serial = self.iSerial
+        return "%04x:%04x:%s" % (self.device.idVendor, self.device.idProduct, serial or '')
+
+    def apply_tuning(self, transfer_size, throughput):
+        """
+        Use transfer_size bytes per bulk transfer and make sure the timeout
+        covers one transfer at throughput MB/s.
+        """
+        self.max_transfer_size = transfer_size
+        self.throughput = throughput
+        if throughput:
+            self.timeout = max(self.timeout, 4 * transfer_size / (throughput * 1e6))
+
+    def load_tuning(self):
+        """
+        Apply the transfer size stored by tune for this device.
+        Returns (max_transfer_size, MB/s) or None if there is none.
+        """
+        try:
+            with open(TUNING_FILE) as f:
+                tuning = json.load(f)[self.tuning_key()]
+        except (IOError, ValueError, KeyError):
+            return None
+        self.apply_tuning(tuning['max_transfer_size'], tuning['throughput'])
+        return (self.max_transfer_size, self.throughput)
+
+    def tune(self, transfer, sizes=None, repeats=3):
+        """
+        Measure the read throughput for a few transfer sizes and keep the
+        fastest. transfer is a message asking for a large response, e.g. a
+        waveform query, or a function doing such a read, e.g. a driver's
+        fetch_waveform. sizes defaults to multiples of the bulk in packet
+        size from 64 kB to 16 MB. The result is stored per VID/PID/serial
+        and applied by load_tuning and on open with auto_tune.
+        Returns (max_transfer_size, MB/s).
+        """
+        if not self.connected:
+            self.open()
+
+        if self.advantest_quirk:
+            # fixed 63 byte reads
+            return (self.max_transfer_size, self.throughput or 0.0)
+
+        if sizes is None:
+            packet_size = self.bulk_in_ep.wMaxPacketSize
+            sizes = [packet_size * 2**k for k in range(7, 16, 2)
+                     if 64*1024 <= packet_size * 2**k <= 16*1024*1024]
+
+        if not callable(transfer):
+            message = transfer
+            transfer = lambda: self.ask_raw(message if type(message) is bytes else str(message).encode('utf-8'))
+
+        old_size = self.max_transfer_size
+        old_timeout = self.timeout
+        best = (old_size, 0.0)
+
+        for size in sizes:
+            self.max_transfer_size = size
+            self.timeout = max(old_timeout, 10.0)
+            try:
+                transfer() # device may need to set up the response first
+                start_bytes = self.bytes_read
+                start = time.perf_counter()
+                for i in range(repeats):
+                    transfer()
+                duration = time.perf_counter() - start
+            except usb.core.USBError:
+                self.clear()
+                continue
+            throughput = (self.bytes_read - start_bytes) / duration / 1e6
+            if throughput > best[1]:
+                best = (size, throughput)
+
+        self.timeout = old_timeout
+        self.apply_tuning(*best)
+
+        if best[1] > 0:
+            try:
+                with open(TUNING_FILE) as f:
+                    tuning = json.load(f)
+            except (IOError, ValueError):
+                tuning = {}
+            tuning[self.tuning_key()] = {'max_transfer_size': best[0], 'throughput': best[1]}
+            with open(TUNING_FILE, 'w') as f:
+                json.dump(tuning, f, indent=2, sort_keys=True)
+
+        return best
 
     def ask_raw(self, data, num=-1):
         "Write then read binary data"